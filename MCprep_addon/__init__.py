@@ -74,6 +74,7 @@ if "bpy" in locals():
 		print("Issue in re-running conf.init()")
 	importlib.reload(mcprep_ui)
 	importlib.reload(materials)
+	importlib.reload(meshswap_plan)
 	importlib.reload(meshswap)
 	importlib.reload(spawner)
 	importlib.reload(world_tools)
@@ -92,6 +93,7 @@ else:
 	from . import (
 		mcprep_ui,
 		materials,
+		meshswap_plan,
 		meshswap,
 		spawner,
 		world_tools,
@@ -176,6 +176,11 @@ def init():
 	global meshswap_list
 	meshswap_list = []
 
+	# index of meshswap blend file contents, to avoid re-reading the library;
+	# keyed by absolute path, each entry tracks the file mtime when built
+	global meshswap_index
+	meshswap_index = {}
+
 
 # -----------------------------------------------------------------------------
 # ICONS INIT
@@ -27,6 +27,9 @@
 import bpy
 import os
 import math
+import re
+import zlib
+import numpy as np
 from bpy_extras.io_utils import ImportHelper
 import shutil
 import urllib.request
@@ -44,6 +47,182 @@ from . import tracking
 
 
 
+# ---------
+# Names of materials with special default settings, before generalizing.
+# A "*" marks a wildcard (max 1 per name): the rest of the name is matched
+# anywhere within the material name
+def getListDataMats():
+
+	reflective = [ 'glass', 'glass_pane_side','ice','ice_packed','iron_bars',
+			'door_iron_top','door_iron_bottom','diamond_block','iron_block',
+			'gold_block','emerald_block','iron_trapdoor','glass_*',
+			'Iron_Door','Glass_Pane','Glass','Stained_Glass_Pane',
+			'Iron_Trapdoor','Block_of_Iron','Block_of_Diamond',
+			'Stained_Glass','Block_of_Gold','Block_of_Emerald',
+			'Packed_Ice','Ice']
+	water = ['water','water_flowing','Stationary_Water']
+	# things are transparent by default to be safe, but if something is solid
+	# it is better to make it solid (faster render and build times)
+	solid = ['sand','dirt','dirt_grass_side','dirt_grass_top',
+			'dispenser_front','furnace_top','redstone_block','gold_block',
+			'stone','iron_ore','coal_ore','wool_*','stained_clay_*',
+			'stone_brick','cobblestone','plank_*','log_*','farmland_wet',
+			'farmland_dry','cobblestone_mossy','nether_brick','gravel',
+			'*_ore','red_sand','dirt_podzol_top','stone_granite_smooth',
+			'stone_granite','stone_diorite','stone_diorite_smooth',
+			'stone_andesite','stone_andesite_smooth','brick','snow',
+			'hardened_clay','sandstone_side','sandstone_side_carved',
+			'sandstone_side_smooth','sandstone_top','red_sandstone_top',
+			'red_sandstone_normal','bedrock','dirt_mycelium_top',
+			'stone_brick_mossy','stone_brick_cracked','stone_brick_circle',
+			'stone_slab_side','stone_slab_top','netherrack','soulsand',
+			'*_block','endstone','Grass_Block','Dirt','Stone_Slab','Stone',
+			'Oak_Wood_Planks','Wooden_Slab','Sand','Carpet','Wool',
+			'Stained_Clay','Gravel','Sandstone','*_Fence','Wood',
+			'Acacia/Dark_Oak_Wood','Farmland','Brick','Snow','Bedrock',
+			'Netherrack','Soul_Sand','End_Stone']
+	emit = ['redstone_block','redstone_lamp_on','glowstone','lava',
+			'lava_flowing','fire','sea_lantern','Glowstone',
+			'Redstone_Lamp_(on)','Stationary_Lava','Fire','Sea_Lantern',
+			'Block_of_Redstone','torch_flame_noimport','Sea-Lantern']
+
+	return {'reflective':reflective, 'water':water, 'solid':solid,
+			'emit':emit}
+
+
+# compiled classification of the lists above, built once per session
+materialClasses = None
+
+
+# ---------
+# Compile the material lists into exact name sets and a single pattern for
+# all wildcard fragments. The pattern is a lookahead so it reports a match at
+# every position; fragments are tried longest first, and each fragment also
+# carries the categories of any shorter fragment it starts with, so the one
+# match found at a position covers all fragments matching there
+def getMaterialClasses():
+	global materialClasses
+	if materialClasses!=None:
+		return materialClasses
+
+	exact = {}
+	fragments = {}
+	for category, names in getListDataMats().items():
+		for name in names:
+			if '*' not in name:
+				exact.setdefault(name, set()).add(category)
+				continue
+			for part in name.split('*'):
+				if part != '':
+					fragments.setdefault(part, set()).add(category)
+	for part in fragments:
+		for other in fragments:
+			if other != part and part.startswith(other):
+				fragments[part] = fragments[part] | fragments[other]
+
+	ordered = sorted(fragments, key=lambda part: (-len(part), part))
+	materialClasses = {
+		"exact":{name:frozenset(cats) for name, cats in exact.items()},
+		"fragments":{part:frozenset(cats) for part, cats in fragments.items()},
+		"pattern":re.compile("(?=({x}))".format(
+			x="|".join(re.escape(part) for part in ordered))),
+		"memo":{}
+		}
+	return materialClasses
+
+
+# ---------
+# Get the set of categories (reflective, water, solid, emit) of a material
+# or block name in one lookup, memoized by the generalized name
+def materialCategories(name):
+	classes = getMaterialClasses()
+	name = util.nameGeneralize(name)
+	if name in classes["memo"]:
+		return classes["memo"][name]
+	cats = set(classes["exact"].get(name, ()))
+	for match in classes["pattern"].finditer(name):
+		cats |= classes["fragments"][match.group(1)]
+	cats = frozenset(cats)
+	classes["memo"][name] = cats
+	return cats
+
+
+# name of the node group shared by all prepped cycles materials
+blockGroupName = "MCprep_block"
+
+# group input values per shading variant; materials start as transparent and
+# apply the variant of each category they belong to
+cyclesVariants = {
+	'transparent':{"Solid":0, "Glossy":0, "Roughness":0.1,
+		"Emission":0, "Emission strength":2.5},
+	'solid':{"Solid":1},
+	'reflective':{"Glossy":0.3, "Roughness":0.005},
+	'emissive':{"Emission":0.9, "Emission strength":2.5},
+	'water':{"Glossy":0.2, "Roughness":0.01},
+	}
+
+
+# ---------
+# Get the node group shared by all prepped cycles materials, creating it if
+# not yet in the file. Diffuse (optionally mixed with emission) is mixed with
+# transparency by the image alpha unless solid, then mixed with glossy
+def getBlockNodeGroup():
+	if blockGroupName in bpy.data.node_groups:
+		return bpy.data.node_groups[blockGroupName]
+
+	group = bpy.data.node_groups.new(blockGroupName, 'ShaderNodeTree')
+	group.inputs.new('NodeSocketColor', "Color")
+	group.inputs.new('NodeSocketFloat', "Alpha")
+	for key in ["Solid", "Glossy", "Roughness", "Emission", "Emission strength"]:
+		socket = group.inputs.new('NodeSocketFloat', key)
+		socket.default_value = cyclesVariants['transparent'][key]
+	group.inputs["Alpha"].default_value = 1
+	group.outputs.new('NodeSocketShader', "Shader")
+
+	nodes = group.nodes
+	links = group.links
+	nodeIn = nodes.new('NodeGroupInput')
+	nodeDiff = nodes.new('ShaderNodeBsdfDiffuse')
+	nodeEmit = nodes.new('ShaderNodeEmission')
+	nodeMixEmit = nodes.new('ShaderNodeMixShader')
+	nodeSolid = nodes.new('ShaderNodeMath')
+	nodeTrans = nodes.new('ShaderNodeBsdfTransparent')
+	nodeMix1 = nodes.new('ShaderNodeMixShader')
+	nodeGloss = nodes.new('ShaderNodeBsdfGlossy')
+	nodeMix2 = nodes.new('ShaderNodeMixShader')
+	nodeOut = nodes.new('NodeGroupOutput')
+	nodeSolid.operation = 'MAXIMUM'
+
+	# set location and connect
+	nodeIn.location = (-600,0)
+	nodeDiff.location = (-400,-100)
+	nodeEmit.location = (-400,-250)
+	nodeMixEmit.location = (-200,-150)
+	nodeSolid.location = (-200,150)
+	nodeTrans.location = (-200,0)
+	nodeMix1.location = (0,0)
+	nodeGloss.location = (0,-200)
+	nodeMix2.location = (200,0)
+	nodeOut.location = (400,0)
+	links.new(nodeIn.outputs["Color"],nodeDiff.inputs[0])
+	links.new(nodeIn.outputs["Color"],nodeEmit.inputs[0])
+	links.new(nodeIn.outputs["Emission strength"],nodeEmit.inputs[1])
+	links.new(nodeIn.outputs["Emission"],nodeMixEmit.inputs[0])
+	links.new(nodeDiff.outputs["BSDF"],nodeMixEmit.inputs[1])
+	links.new(nodeEmit.outputs["Emission"],nodeMixEmit.inputs[2])
+	links.new(nodeIn.outputs["Alpha"],nodeSolid.inputs[0])
+	links.new(nodeIn.outputs["Solid"],nodeSolid.inputs[1])
+	links.new(nodeSolid.outputs["Value"],nodeMix1.inputs[0])
+	links.new(nodeTrans.outputs["BSDF"],nodeMix1.inputs[1])
+	links.new(nodeMixEmit.outputs["Shader"],nodeMix1.inputs[2])
+	links.new(nodeIn.outputs["Roughness"],nodeGloss.inputs[1])
+	links.new(nodeIn.outputs["Glossy"],nodeMix2.inputs[0])
+	links.new(nodeMix1.outputs["Shader"],nodeMix2.inputs[1])
+	links.new(nodeGloss.outputs["BSDF"],nodeMix2.inputs[2])
+	links.new(nodeMix2.outputs["Shader"],nodeOut.inputs["Shader"])
+	return group
+
+
 class MCPREP_materialChange(bpy.types.Operator):
 	"""Fixes materials and textures on selected objects for Minecraft rendering"""
 	bl_idname = "mcprep.mat_change"
@@ -79,77 +258,9 @@ class MCPREP_materialChange(bpy.types.Operator):
 		col.prop(self, "combineMaterials")
 		# tick box to enable tracking
 	
-	def getListDataMats(self):
-
-		reflective = [ 'glass', 'glass_pane_side','ice','ice_packed','iron_bars',
-				'door_iron_top','door_iron_bottom','diamond_block','iron_block',
-				'gold_block','emerald_block','iron_trapdoor','glass_*',
-				'Iron_Door','Glass_Pane','Glass','Stained_Glass_Pane',
-				'Iron_Trapdoor','Block_of_Iron','Block_of_Diamond',
-				'Stained_Glass','Block_of_Gold','Block_of_Emerald',
-				'Packed_Ice','Ice']
-		water = ['water','water_flowing','Stationary_Water']
-		# things are transparent by default to be safe, but if something is solid
-		# it is better to make it solid (faster render and build times)
-		solid = ['sand','dirt','dirt_grass_side','dirt_grass_top',
-				'dispenser_front','furnace_top','redstone_block','gold_block',
-				'stone','iron_ore','coal_ore','wool_*','stained_clay_*',
-				'stone_brick','cobblestone','plank_*','log_*','farmland_wet',
-				'farmland_dry','cobblestone_mossy','nether_brick','gravel',
-				'*_ore','red_sand','dirt_podzol_top','stone_granite_smooth',
-				'stone_granite','stone_diorite','stone_diorite_smooth',
-				'stone_andesite','stone_andesite_smooth','brick','snow',
-				'hardened_clay','sandstone_side','sandstone_side_carved',
-				'sandstone_side_smooth','sandstone_top','red_sandstone_top',
-				'red_sandstone_normal','bedrock','dirt_mycelium_top',
-				'stone_brick_mossy','stone_brick_cracked','stone_brick_circle',
-				'stone_slab_side','stone_slab_top','netherrack','soulsand',
-				'*_block','endstone','Grass_Block','Dirt','Stone_Slab','Stone',
-				'Oak_Wood_Planks','Wooden_Slab','Sand','Carpet','Wool',
-				'Stained_Clay','Gravel','Sandstone','*_Fence','Wood',
-				'Acacia/Dark_Oak_Wood','Farmland','Brick','Snow','Bedrock',
-				'Netherrack','Soul_Sand','End_Stone']
-		emit = ['redstone_block','redstone_lamp_on','glowstone','lava',
-				'lava_flowing','fire','sea_lantern','Glowstone',
-				'Redstone_Lamp_(on)','Stationary_Lava','Fire','Sea_Lantern',
-				'Block_of_Redstone','torch_flame_noimport','Sea-Lantern']
-
-		######## CHANGE TO MATERIALS LIBRARY
-		# if v and not importedMats:print("Parsing library file for materials")
-		# #attempt to LOAD information from an asset file...
-		# matLibPath = bpy.context.scene.MCprep_material_path
-		# if not(os.path.isfile(matLibPath)):
-		# 	#extract actual path from the relative one
-		# 	matLibPath = bpy.path.abspath(matLibPath)
-
-		# WHAT IT SHOULD DO: check the NAME of the current material,
-		# and ONLY import that one if it's there. maybe split this into another function
-		# imported mats is a bool so we only attempt to load one time instead of like fifty.
-		# now go through the new materials and change them for the old...?
-
-		return {'reflective':reflective, 'water':water, 'solid':solid,
-				'emit':emit}
-	
-	# helper function for expanding wildcard naming for generalized materials
-	# maximum 1 wildcard *
-	def checklist(self,matName,alist):
-		if matName in alist:
-			return True
-		else:
-			for name in alist:
-				if '*' in name:
-					x = name.split('*')
-					if x[0] != '' and x[0] in matName:
-						return True
-					elif x[1] != '' and x[1] in matName:
-						return True
-			return False
-
 	## HERE functions for GENERAL material setup (cycles and BI)
 	def materialsInternal(self, mat):
 
-		# defines lists for materials with special default settings.
-		listData = self.getListDataMats()
 		try:
 			newName = mat.name+'_tex' # add exception to skip? with warning?
 			texList = mat.texture_slots.values()
@@ -171,6 +282,7 @@ class MCPREP_materialChange(bpy.types.Operator):
 
 		# strip out the .00#
 		matGen = util.nameGeneralize(mat.name)
+		cats = materialCategories(matGen)
 		mat.use_nodes = False
 
 		mat.use_transparent_shadows = True #all materials receive trans
@@ -182,14 +294,14 @@ class MCPREP_materialChange(bpy.types.Operator):
 		mat.texture_slots[0].diffuse_color_factor = 1
 		mat.use_textures[1] = False
 
-		if not self.checklist(matGen,listData['solid']): # alpha default on
+		if 'solid' not in cats: # alpha default on
 			bpy.data.textures[newName].use_alpha = True
 			mat.texture_slots[0].use_map_alpha = True
 			mat.use_transparency = True
 			mat.alpha = 0
 			mat.texture_slots[0].alpha_factor = 1
 		   
-		if self.useReflections and self.checklist(matGen,listData['reflective']):
+		if self.useReflections and 'reflective' in cats:
 			mat.alpha=0.15
 			mat.raytrace_mirror.use = True
 			mat.raytrace_mirror.reflect_factor = 0.3
@@ -197,7 +309,7 @@ class MCPREP_materialChange(bpy.types.Operator):
 			mat.raytrace_mirror.use = False
 			mat.alpha=0
 	   
-		if self.checklist(matGen,listData['emit']):
+		if 'emit' in cats:
 			mat.emit = 1
 		else:
 			mat.emit = 0
@@ -210,72 +322,39 @@ class MCPREP_materialChange(bpy.types.Operator):
 			imageTex = mat.texture_slots[0].texture.image
 		except:
 			return
-		matGen = util.nameGeneralize(mat.name)
-		listData = self.getListDataMats()
-
-		#enable nodes
+		cats = materialCategories(mat.name)
+
+		# shader parameters, layered per category in the same order as before
+		params = dict(cyclesVariants['transparent'])
+		if self.useReflections and 'reflective' in cats:
+			params.update(cyclesVariants['reflective'])
+		if 'emit' in cats:
+			params.update(cyclesVariants['emissive'])
+		if 'water' in cats:
+			params.update(cyclesVariants['water'])
+		if 'solid' in cats:
+			params.update(cyclesVariants['solid'])
+
+		# enable nodes, the shading itself lives in the shared node group
 		mat.use_nodes = True
 		nodes = mat.node_tree.nodes
 		links = mat.node_tree.links
 		nodes.clear()
-		nodeDiff = nodes.new('ShaderNodeBsdfDiffuse')
-		nodeGloss = nodes.new('ShaderNodeBsdfGlossy')
-		nodeTrans = nodes.new('ShaderNodeBsdfTransparent')
-		nodeMix1 = nodes.new('ShaderNodeMixShader')
-		nodeMix2 = nodes.new('ShaderNodeMixShader')
 		nodeTex = nodes.new('ShaderNodeTexImage')
+		nodeGroup = nodes.new('ShaderNodeGroup')
 		nodeOut = nodes.new('ShaderNodeOutputMaterial')
-		
-		# set location and connect
+		nodeGroup.node_tree = getBlockNodeGroup()
 		nodeTex.location = (-400,0)
-		nodeGloss.location = (0,-150)
-		nodeDiff.location = (-200,-150)
-		nodeTrans.location = (-200,0)
-		nodeMix1.location = (0,0)
-		nodeMix2.location = (200,0)
-		nodeOut.location = (400,0)
-		links.new(nodeTex.outputs["Color"],nodeDiff.inputs[0])
-		links.new(nodeDiff.outputs["BSDF"],nodeMix1.inputs[2])
-		links.new(nodeTex.outputs["Alpha"],nodeMix1.inputs[0])
-		links.new(nodeTrans.outputs["BSDF"],nodeMix1.inputs[1])
-		links.new(nodeGloss.outputs["BSDF"],nodeMix2.inputs[2])
-		links.new(nodeMix1.outputs["Shader"],nodeMix2.inputs[1])
-		links.new(nodeMix2.outputs["Shader"],nodeOut.inputs[0])
+		nodeGroup.location = (-100,0)
+		nodeOut.location = (200,0)
+		links.new(nodeTex.outputs["Color"],nodeGroup.inputs["Color"])
+		links.new(nodeTex.outputs["Alpha"],nodeGroup.inputs["Alpha"])
+		links.new(nodeGroup.outputs["Shader"],nodeOut.inputs[0])
 		nodeTex.image = imageTex
 		nodeTex.interpolation = 'Closest'
+		for key, value in params.items():
+			nodeGroup.inputs[key].default_value = value
 
-		#set other default values, e.g. the mixes
-		nodeMix2.inputs[0].default_value = 0 # factor mix with glossy
-		nodeGloss.inputs[1].default_value = 0.1 # roughness
-
-		# the above are all default nodes. Now see if in specific lists
-		if self.useReflections and self.checklist(matGen,listData['reflective']):
-			nodeMix2.inputs[0].default_value = 0.3  # mix factor
-			nodeGloss.inputs[1].default_value = 0.005 # roughness
-		if self.checklist(matGen,listData['emit']):
-			# add an emit node, insert it before the first mix node
-			nodeMixEmitDiff = nodes.new('ShaderNodeMixShader')
-			nodeEmit = nodes.new('ShaderNodeEmission')
-			nodeEmit.location = (-400,-150)
-			nodeMixEmitDiff.location = (-200,-150)
-			nodeDiff.location = (-400,0)
-			nodeTex.location = (-600,0)
-
-			links.new(nodeTex.outputs["Color"],nodeEmit.inputs[0])
-			links.new(nodeDiff.outputs["BSDF"],nodeMixEmitDiff.inputs[1])
-			links.new(nodeEmit.outputs["Emission"],nodeMixEmitDiff.inputs[2])
-			links.new(nodeMixEmitDiff.outputs["Shader"],nodeMix1.inputs[2])
-
-			nodeMixEmitDiff.inputs[0].default_value = 0.9
-			nodeEmit.inputs[1].default_value = 2.5
-			# emit value
-		if self.checklist(matGen,listData['water']):
-			# setup the animation??
-			nodeMix2.inputs[0].default_value = 0.2
-			nodeGloss.inputs[1].default_value = 0.01 # copy of reflective for now
-		if self.checklist(matGen,listData['solid']):
-			#links.remove(nodeTrans.outputs["BSDF"],nodeMix1.inputs[1])
-			nodeMix1.inputs[0].default_value = 0 # no transparency
 		try:
 			if nodeTex.image.source =='SEQUENCE':
 				nodeTex.image_user.use_cyclic = True
@@ -300,7 +379,7 @@ class MCPREP_materialChange(bpy.types.Operator):
 
 		# gets the list of materials (without repetition) from selected
 		matList = util.materialsFromObj(objList)
-		if len(objList)==0:
+		if len(matList)==0:
 			self.report({'ERROR'}, "No materials found on selected objects")
 			return {'CANCELLED'}
 		
@@ -332,10 +411,158 @@ class MCPREP_materialChange(bpy.types.Operator):
 
 
 
+# -----------------------------------------------------------------------------
+# Datablock fingerprints, for combining by content
+# -----------------------------------------------------------------------------
+
+
+# ---------
+# Fingerprint of an image by its contents: pixel size, source, colorspace and
+# alpha settings, and a crc32 of the packed or source file bytes, else of the
+# pixel buffer. Images painted on since loading (dirty) differ from their
+# file, so use the pixel buffer too. Files already read are cached in fileKeys
+# by absolute path. Returns None if nothing to compare
+def imageFingerprint(image, fileKeys=None):
+	if fileKeys==None: fileKeys = {}
+	base = (image.source, tuple(image.size), image.colorspace_settings.name,
+			getattr(image, "alpha_mode", None), getattr(image, "use_alpha", None))
+	if image.packed_file!=None and not image.is_dirty:
+		data = image.packed_file.data
+		return base+("packed", len(data), zlib.crc32(data))
+
+	path = bpy.path.abspath(image.filepath)
+	if image.source in ['FILE','SEQUENCE','MOVIE'] and os.path.isfile(path) \
+			and not image.is_dirty:
+		if path not in fileKeys:
+			crc = 0
+			with open(path, 'rb') as img_file:
+				for block in iter(lambda: img_file.read(1<<20), b''):
+					crc = zlib.crc32(block, crc)
+			fileKeys[path] = ("file", os.path.getsize(path), crc)
+		return base+fileKeys[path]
+
+	if image.source!='GENERATED' and not image.has_data: return None
+	pixels = np.zeros(len(image.pixels), dtype=np.float32)
+	try:
+		image.pixels.foreach_get(pixels)
+	except:
+		pixels[:] = image.pixels[:]
+	return base+("pixels", len(pixels), zlib.crc32(pixels.tobytes()))
+
+
+# ---------
+# hashable value of a node socket or property, None for shader sockets
+def socketValue(value):
+	if isinstance(value, float):
+		return round(value, 5)
+	if isinstance(value, (set, frozenset)):
+		return tuple(sorted(value))
+	if hasattr(value, "__len__") and not isinstance(value, str):
+		return tuple(socketValue(val) for val in value)
+	return value
+
+
+# ---------
+# Hashable values of every editable property of a datablock or other struct,
+# except those named in skip. Datablocks pointed to are keyed by idKey, other
+# structs and collections (e.g. the mirror settings or texture slots of a
+# material) are included down to the given depth
+def rnaValues(struct, idKey, skip=(), depth=2):
+	values = []
+	for prop in struct.bl_rna.properties:
+		name = prop.identifier
+		if name == 'rna_type' or name in skip: continue
+		value = getattr(struct, name, None)
+		if prop.type == 'COLLECTION':
+			if depth > 0:
+				values.append((name, tuple(None if item==None else
+						rnaValues(item, idKey, (), depth-1) for item in value)))
+		elif prop.type == 'POINTER':
+			if value == None:
+				values.append((name, None))
+			elif isinstance(value, bpy.types.ID):
+				values.append((name, idKey(value)))
+			elif depth > 0:
+				values.append((name, rnaValues(value, idKey, (), depth-1)))
+		elif not prop.is_readonly:
+			values.append((name, socketValue(value)))
+	return tuple(values)
+
+
+# ---------
+# Fingerprint of a material by its settings: for a node material every node
+# setting (not its name, location or other layout), unlinked socket values
+# and links; otherwise every blender internal material setting, including
+# texture slots and the settings of their textures. Images are compared by
+# content, with imageKeys caching the fingerprint per image name
+def materialFingerprint(mat, imageKeys=None, fileKeys=None):
+	if imageKeys==None: imageKeys = {}
+	idSkip = set([prop.identifier for prop in bpy.types.ID.bl_rna.properties])
+	textureKeys = {}
+
+	def idKey(block):
+		if isinstance(block, bpy.types.Image):
+			if block.name not in imageKeys:
+				imageKeys[block.name] = imageFingerprint(block, fileKeys) \
+						or ("name", block.name)
+			return imageKeys[block.name]
+		elif isinstance(block, bpy.types.Texture):
+			if block.name not in textureKeys:
+				textureKeys[block.name] = None # guards against cycles
+				textureKeys[block.name] = rnaValues(block, idKey,
+						idSkip | set(["users_material", "node_tree"]))
+			return textureKeys[block.name]
+		return (type(block).__name__, block.name)
+
+	if mat.use_nodes and mat.node_tree!=None:
+		nodeSkip = set([prop.identifier for prop in bpy.types.Node.bl_rna.properties])
+		nodeSkip.discard("mute") # muting changes the result
+		nodes = list(mat.node_tree.nodes)
+		nodeIndex = {node.name:i for i, node in enumerate(nodes)}
+		desc = []
+		for node in nodes:
+			inputs = tuple(socketValue(getattr(inp, "default_value", None))
+					for inp in node.inputs if not inp.is_linked)
+			outputs = tuple(socketValue(getattr(out, "default_value", None))
+					for out in node.outputs)
+			desc.append((node.bl_idname, rnaValues(node, idKey, nodeSkip),
+					inputs, outputs))
+		links = sorted((nodeIndex[link.from_node.name], link.from_socket.identifier,
+				nodeIndex[link.to_node.name], link.to_socket.identifier)
+				for link in mat.node_tree.links)
+		return ("nodes", tuple(desc), tuple(links))
+
+	# interface only settings are left out, as they don't change the render
+	matSkip = idSkip | set(["active_texture", "active_texture_index",
+			"active_node_material", "preview_render_type", "use_preview_world",
+			"node_tree", "use_nodes", "texture_paint_images",
+			"texture_paint_slots", "paint_active_slot"])
+	return ("internal", rnaValues(mat, idKey, matSkip))
+
+
+# ---------
+# Reverse index of materials to the objects using them, built in one pass
+# over the given objects. Returns the materials in order of first use, and
+# the index of each material to its list of objects
+def materialUsers(objects):
+	mats = []
+	users = {}
+	for ob in objects:
+		for sl in ob.material_slots:
+			if sl == None or sl.material == None:continue
+			if sl.material not in users:
+				users[sl.material] = []
+				mats.append(sl.material)
+			if ob not in users[sl.material][-1:]:
+				users[sl.material].append(ob)
+	return mats, users
+
+
 class MCPREP_combineMaterials(bpy.types.Operator):
 	bl_idname = "mcprep.combine_materials"
 	bl_label = "Combine materials"
 	bl_description = "Consolidate the same materials together e.g. mat.001 and mat.002"
+	bl_options = {'REGISTER', 'UNDO'}
 
 	# arg to auto-force remove old? versus just keep as 0-users
 	selection_only = bpy.props.BoolProperty(
@@ -343,6 +570,11 @@ class MCPREP_combineMaterials(bpy.types.Operator):
 		description = "Build materials to consoldiate based on selected objects only",
 		default = True
 		)
+	match_content = bpy.props.BoolProperty(
+		name = "Match content",
+		description = "Combine materials with the same settings and images, instead of by name",
+		default = False
+		)
 
 	def execute(self, context):
 
@@ -351,6 +583,10 @@ class MCPREP_combineMaterials(bpy.types.Operator):
 		if self.selection_only==True and len(context.selected_objects)==0:
 			self.report({'ERROR',"Either turn selection only off or select objects with materials"})
 			return {'CANCELLED'}
+		if self.match_content==True and \
+				(bpy.app.version[0]>=2 and bpy.app.version[1] >= 78) == False:
+			self.report({'ERROR'},"Must use blender 2.78 or higher to match content")
+			return {'CANCELLED'}
 
 
 		# 2-level structure to hold base name and all
@@ -358,19 +594,10 @@ class MCPREP_combineMaterials(bpy.types.Operator):
 		nameCat = {}
 
 
-		def getMaterials(self, context):
-			if self.selection_only == False:
-				return bpy.data.materials
-			else:
-				mats = []
-				for ob in bpy.data.objects:
-					for sl in ob.material_slots:
-						if sl == None or sl.material == None:continue
-						if sl.material in mats:continue
-						mats.append(sl.material)
-				return mats
-
-		data = getMaterials(self, context)
+		if self.selection_only == False:
+			data = list(bpy.data.materials)
+		else:
+			data, users = materialUsers(context.selected_objects)
 		precount = len( ["x" for x in data if x.users >0] )
 
 		if len(data)==0:
@@ -380,9 +607,14 @@ class MCPREP_combineMaterials(bpy.types.Operator):
 				self.report({"ERROR"},"No materials in open file")
 			return {'CANCELLED'}
 
-		# get and categorize all materials names
+		# get and categorize all materials names, or contents
+		imageKeys = {}
+		fileKeys = {}
 		for mat in data:
-			base = util.nameGeneralize(mat.name)
+			if self.match_content:
+				base = materialFingerprint(mat, imageKeys, fileKeys)
+			else:
+				base = util.nameGeneralize(mat.name)
 			if base not in nameCat:
 				nameCat[base] = [mat.name]
 			elif mat.name not in nameCat[base]:
@@ -393,11 +625,13 @@ class MCPREP_combineMaterials(bpy.types.Operator):
 
 		# pre 2.78 solution, deep loop
 		if (bpy.app.version[0]>=2 and bpy.app.version[1] >= 78) == False:
-			for ob in bpy.data.objects:
-				for sl in ob.material_slots:
-					if sl == None or sl.material == None:continue
-					if sl.material not in data: continue # selection only
-					sl.material = bpy.data.materials[nameCat[ util.nameGeneralize(sl.material.name) ][0]]
+			if self.selection_only == False:
+				users = materialUsers(bpy.data.objects)[1]
+			for mat in users:
+				newMat = bpy.data.materials[nameCat[ util.nameGeneralize(mat.name) ][0]]
+				for ob in users[mat]:
+					for sl in ob.material_slots:
+						if sl.material == mat: sl.material = newMat
 			# doesn't remove old textures, but gets it to zero users
 			
 			postcount = len( ["x" for x in bpy.data.materials if x.users >0] )
@@ -407,31 +641,38 @@ class MCPREP_combineMaterials(bpy.types.Operator):
 				y=postcount))
 			return {'FINISHED'}
 
-		# perform the consolidation with one basename set at a time
+		# map the other materials of each basename set onto its base material
+		mapping = {}
+		baseMats = []
 		for base in nameCat: # the keys of the dictionary
-			if len(base)<2: continue
+			if self.match_content and len(nameCat[base])<2: continue
+			elif not self.match_content and len(base)<2: continue
 			
 			nameCat[base].sort() # in-place sorting
 			baseMat = bpy.data.materials[ nameCat[base][0] ]
+			baseMats.append(baseMat)
 
 			if conf.vv:print(nameCat[base], "##", baseMat )
 
 			for matname in nameCat[base][1:]:
-
 				# skip if fake user set
 				if bpy.data.materials[matname].use_fake_user == True: continue 
-				# otherwise, remap
-				res = util.remap_users(bpy.data.materials[matname],baseMat)
-				if res != 0:
-					self.report({'ERROR'}, str(res))
-					return {'CANCELLED'}
-				old = bpy.data.materials[matname]
-				if conf.vv:print("removing old? ",bpy.data.materials[matname])
-				if removeold==True and old.users==0:
-					if conf.vv:print("removing old:")
-					data.remove( bpy.data.materials[matname] )
-			
-			# Final step.. rename to not have .001 if it does
+				mapping[bpy.data.materials[matname]] = baseMat
+
+		# remap all sets at once, then remove the old materials
+		res = util.remapMaterials(mapping)
+		if res != 0:
+			self.report({'ERROR'}, str(res))
+			return {'CANCELLED'}
+		remaining = set(mapping.get(mat, mat) for mat in data)
+		if removeold==True:
+			for old in mapping:
+				if old.users!=0: continue
+				if conf.vv:print("removing old:", old.name)
+				bpy.data.materials.remove(old)
+
+		# Final step.. rename to not have .001 if it does
+		for baseMat in baseMats:
 			genBase = util.nameGeneralize(baseMat.name)
 			if baseMat.name != genBase:
 				if genBase in bpy.data.materials and bpy.data.materials[genBase].users!=0:
@@ -442,7 +683,9 @@ class MCPREP_combineMaterials(bpy.types.Operator):
 				baseMat.name = genBase
 			if conf.vv:print("Final: ",baseMat)
 
-		postcount = len( ["x" for x in getMaterials(self, context) if x.users >0] )
+		if self.selection_only == False:
+			remaining = bpy.data.materials
+		postcount = len( ["x" for x in remaining if x.users >0] )
 		self.report({"INFO"},
 				"Consolidated {x} materials down to {y}".format(
 				x=precount,
@@ -455,6 +698,7 @@ class MCPREP_combineImages(bpy.types.Operator):
 	bl_idname = "mcprep.combine_images"
 	bl_label = "Combine images"
 	bl_description = "Consolidate the same images together e.g. img.001 and img.002"
+	bl_options = {'REGISTER', 'UNDO'}
 
 	# arg to auto-force remove old? versus just keep as 0-users
 	selection_only = bpy.props.BoolProperty(
@@ -462,6 +706,11 @@ class MCPREP_combineImages(bpy.types.Operator):
 		description = "Build images to consoldiate based on selected objects' materials only",
 		default = False
 		)
+	match_content = bpy.props.BoolProperty(
+		name = "Match content",
+		description = "Combine images with the same file or pixel contents, instead of by name",
+		default = False
+		)
 	
 	def execute(self, context):
 
@@ -487,9 +736,13 @@ class MCPREP_combineImages(bpy.types.Operator):
 
 		precount = len(data)
 
-		# get and categorize all image names
+		# get and categorize all image names, or contents
+		fileKeys = {}
 		for im in bpy.data.images:
-			base = util.nameGeneralize(im.name)
+			if self.match_content:
+				base = imageFingerprint(im, fileKeys) or ("name", im.name)
+			else:
+				base = util.nameGeneralize(im.name)
 			if base not in nameCat:
 				nameCat[base] = [im.name]
 			elif im.name not in nameCat[base]:
@@ -515,7 +768,8 @@ class MCPREP_combineImages(bpy.types.Operator):
 
 		# perform the consolidation with one basename set at a time
 		for base in nameCat:
-			if len(base)<2: continue
+			if self.match_content and len(nameCat[base])<2: continue
+			elif not self.match_content and len(base)<2: continue
 			
 			nameCat[base].sort() # in-place sorting
 			baseImg = bpy.data.images[ nameCat[base][0] ]
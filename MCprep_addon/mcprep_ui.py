@@ -601,6 +601,7 @@ class MCpanel(bpy.types.Panel):
 					text="Improve UI", icon='SETTINGS')
 		
 		col.operator("mcprep.meshswap", text="Mesh Swap", icon='LINK_BLEND')
+		col.operator("mcprep.meshswap_lod", text="Update meshswap LOD")
 		#the UV's pixels into actual 3D geometry (but same material, or modified to fit)
 		#col.operator("object.solidify_pixels", text="Solidify Pixels", icon='MOD_SOLIDIFY')
 		split = layout.split()
@@ -25,15 +25,23 @@
 
 # library imports
 import bpy
+import bmesh
 import os
+import re
 import math
 import mathutils
-import random
+import time
+import json
+import multiprocessing
+import concurrent.futures
+import numpy as np
 
 # addon imports
 from . import conf
 from . import util
 from . import tracking
+from . import materials
+from . import meshswap_plan
 
 
 # -----------------------------------------------------------------------------
@@ -70,30 +78,34 @@ def updateMeshswapList(context):
 	meshswap_list = []
 	# conf.meshswap_list = []
 
-	with bpy.data.libraries.load(meshswap_file) as (data_from, data_to):
-		for name in data_from.groups:
+	index = getLibraryIndex(meshswap_file)
+	for name in (index["groups"] if index else []):
 
-			# special cases, skip some groups/repeats
-			if util.nameGeneralize(name).lower() in temp_meshswap_list: continue
-			if util.nameGeneralize(name).lower() == "Rigidbodyworld".lower():
-				continue
+		# special cases, skip some groups/repeats
+		if util.nameGeneralize(name).lower() in temp_meshswap_list: continue
+		if lodPattern.match(name): continue # level of detail variant
+		if util.nameGeneralize(name).lower() == "Rigidbodyworld".lower():
+			continue
 
 
-			description = "Place {x} block".format(x=name)
-			meshswap_list.append( ("Group/"+name,name.title(),description) )
-			temp_meshswap_list.append(util.nameGeneralize(name).lower())
-		# here do same for blocks, assuming no name clashes. 
-		# way to 'ignore' blocks from source? ID prop?
+		description = "Place {x} block".format(x=name)
+		meshswap_list.append( ("Group/"+name,name.title(),description) )
+		temp_meshswap_list.append(util.nameGeneralize(name).lower())
+	# here do same for blocks, assuming no name clashes. 
+	# way to 'ignore' blocks from source? ID prop?
 
-		# for name in data_from.objects:
-		# 	if util.nameGeneralize(name).lower() in temp_meshswap_list: continue
-		# 	description = "Place {x} block".format(x=name)
-		# 	meshswap_list.append( ("Object/"+name,name.title(),description) )
-		# 	temp_meshswap_list.append(util.nameGeneralize(name).lower())
+	# for name in index["objects"]:
+	# 	if util.nameGeneralize(name).lower() in temp_meshswap_list: continue
+	# 	description = "Place {x} block".format(x=name)
+	# 	meshswap_list.append( ("Object/"+name,name.title(),description) )
+	# 	temp_meshswap_list.append(util.nameGeneralize(name).lower())
 
 	# sort the list alphebtically by name
-	temp, sorted_blocks = zip(*sorted(zip([block[1].lower() for block in meshswap_list], meshswap_list)))
-	conf.meshswap_list = sorted_blocks
+	if len(meshswap_list)>0:
+		temp, sorted_blocks = zip(*sorted(zip([block[1].lower() for block in meshswap_list], meshswap_list)))
+		conf.meshswap_list = sorted_blocks
+	else:
+		conf.meshswap_list = []
 
 	# now re-populate the UI list
 	context.scene.mcprep_meshswap_list.clear()
@@ -106,6 +118,206 @@ def updateMeshswapList(context):
 	return conf.meshswap_list
 
 
+# materials per exporter which are only removed, never swapped
+removableBlocks = {
+	"jmc2obj":['double_plant_grass_top','torch_flame','cactus_side','cactus_bottom','book',
+				'enchant_table_side','enchant_table_bottom','door_iron_top','door_wood_top',
+				'brewing_stand','door_dark_oak_upper','door_acacia_upper','door_jungle_upper',
+				'door_birch_upper','door_spruce_upper','tnt_top','tnt_bottom'],
+	"Mineways":[] # Mineways removable objs
+	}
+
+
+# custom properties on meshswap groups/objects which set swap behavior
+swapPropNames = ['variance','edgeFloat','torchlike','doorlike','edgeFlush',
+				'removable']
+
+
+# library names of level of detail variants, e.g. torch_LOD1 for torch
+lodPattern = re.compile(r"^(.+)_LOD(\d+)$")
+
+
+# Get the index of groups and objects in a meshswap blend file, plus any swap
+# properties recorded per block. Built once per path and file modification
+# time, so the library is only re-read when the file actually changes
+def getLibraryIndex(meshswap_file):
+	meshswap_file = bpy.path.abspath(meshswap_file)
+	if os.path.isfile(meshswap_file)==False:
+		return None
+	mtime = os.path.getmtime(meshswap_file)
+	index = conf.meshswap_index.get(meshswap_file)
+	if index!=None and index["mtime"]==mtime:
+		return index
+
+	if conf.v:print("Building meshswap library index: "+meshswap_file)
+	with bpy.data.libraries.load(meshswap_file) as (data_from, data_to):
+		groups = list(data_from.groups)
+		objects = list(data_from.objects)
+	# level of detail variants per base name, ordered by level
+	lods = {}
+	for name in set(groups+objects):
+		match = lodPattern.match(name)
+		if match:
+			lods.setdefault(match.group(1), []).append((int(match.group(2)), name))
+	index = {"mtime":mtime, "groups":groups, "objects":objects,
+			"group_set":set(groups), "object_set":set(objects),
+			"lods":{base:[name for level, name in sorted(variants)]
+					for base, variants in lods.items()},
+			"props":{}} # props filled in as blocks are first read
+	conf.meshswap_index[meshswap_file] = index
+	return index
+
+
+# names of a block and its level of detail variants of the same kind (group
+# or object) in the library, ordered from most to least detailed
+def lodNames(index, name, grouped):
+	available = index["group_set"] if grouped else index["object_set"]
+	return [name]+[lod for lod in index["lods"].get(name, []) if lod in available]
+
+
+# read the swap properties off an (appended) group or object
+def swapPropsFromBlock(block):
+	props = {}
+	for key in block.keys():
+		if key in swapPropNames:
+			props[key] = block[key]
+	return props
+
+
+# Read the swap properties of groups and objects in a meshswap blend file into
+# its library index, for those not read yet. The blocks are linked only to read
+# them, and every datablock the link added to the file is removed again
+def readLibraryProps(meshswap_file, index, groups, objects):
+	groups = [name for name in groups if name not in index["props"]]
+	objects = [name for name in objects if name not in index["props"]]
+	if len(groups)+len(objects)==0: return
+	# every kind of datablock but libraries, objects first so nothing removed
+	# later is still in use by them
+	kinds = [prop.identifier for prop in bpy.data.bl_rna.properties
+			if prop.type == 'COLLECTION' and prop.identifier != 'libraries']
+	kinds.sort(key=lambda kind: kind != 'objects')
+	before = set()
+	for kind in kinds:
+		before.update([block for block in getattr(bpy.data, kind)
+				if block.library!=None])
+	libraries = set(bpy.data.libraries)
+
+	path = bpy.path.abspath(meshswap_file)
+	with bpy.data.libraries.load(path, link=True) as (data_from, data_to):
+		data_to.groups = groups
+		data_to.objects = objects
+	for name, block in zip(groups+objects, data_to.groups+data_to.objects):
+		index["props"][name] = swapPropsFromBlock(block) if block!=None else {}
+
+	for kind in kinds:
+		coll = getattr(bpy.data, kind)
+		for block in [block for block in coll
+				if block.library!=None and block not in before]:
+			coll.remove(block)
+	for lib in [lib for lib in bpy.data.libraries if lib not in libraries]:
+		try:
+			bpy.data.libraries.remove(lib)
+		except:
+			if conf.v:print("Could not remove meshswap library: "+lib.filepath)
+
+
+# bulk read face centers, normals, areas and material indices of a mesh, in
+# local coordinates, as numpy arrays (Nx3 for centers and normals)
+def getFaceArrays(obj):
+	polys = obj.data.polygons
+	count = len(polys)
+	centers = np.empty(count*3, dtype=np.float32)
+	normals = np.empty(count*3, dtype=np.float32)
+	areas = np.empty(count, dtype=np.float32)
+	matIndex = np.empty(count, dtype=np.int32)
+	polys.foreach_get("center", centers)
+	polys.foreach_get("normal", normals)
+	polys.foreach_get("area", areas)
+	polys.foreach_get("material_index", matIndex)
+	centers = centers.reshape(count,3).astype(np.float64)
+	normals = normals.reshape(count,3).astype(np.float64)
+	return centers, normals, areas, matIndex
+
+
+# group face indices by material index, as (slot, face index array) pairs
+def splitByMaterial(matIndex):
+	order = np.argsort(matIndex, kind='mergesort')
+	slots, starts = np.unique(matIndex[order], return_index=True)
+	return zip(slots.tolist(), np.split(order, starts[1:]))
+
+
+# delete faces by index from the mesh of one or more objects sharing it, in
+# one go so indices stay valid, and the objects themselves if no faces would
+# be left
+def removeMeshFaces(objs, faces):
+	if not isinstance(objs, list): objs = [objs]
+	mesh = objs[0].data
+	faces = np.unique(faces)
+	if len(faces) >= len(mesh.polygons):
+		for obj in objs:
+			bpy.data.objects.remove(obj, do_unlink=True)
+		return
+	bm = bmesh.new()
+	bm.from_mesh(mesh)
+	bm.faces.ensure_lookup_table()
+	bmesh.ops.delete(bm, geom=[bm.faces[i] for i in faces.tolist()],
+			context=5) # 5 is faces, with their loose edges and verts
+	bm.to_mesh(mesh)
+	bm.free()
+	mesh.update()
+
+
+# rotation of a swapped block, matching the source object; special case of an
+# un-applied, 90(+/- 0.01)-0-0 rotation on source (y-up conversion)
+def baseRotation(swap):
+	rotation = list(swap.rotation_euler)
+	if (rotation[0]>= math.pi/2-.01 and rotation[0]<= math.pi/2+.01
+			and rotation[1]==0 and rotation[2]==0):
+		rotation[0] -= math.pi/2
+	return rotation
+
+
+# Timers and counters per meshswap phase, for the operator report and a JSON
+# log. When disabled every call returns right away, so instrumented code costs
+# next to nothing
+class MeshswapStats():
+
+	def __init__(self, enabled):
+		self.enabled = enabled
+		self.phases = {} # phase name: {"time":seconds, counter name:count}
+		self.startTime = time.time()
+
+	# start time of a phase, to pass to stop()
+	def start(self):
+		if not self.enabled: return 0
+		return time.time()
+
+	# add the time since start to a phase, and any {counter:amount} counts
+	def stop(self, phase, start, counts=None):
+		if not self.enabled: return
+		self.add(phase, time.time()-start, counts)
+
+	# add seconds and counts to a phase, e.g. as timed in a worker process
+	def add(self, phase, seconds, counts=None):
+		if not self.enabled: return
+		entry = self.phases.setdefault(phase, {"time":0})
+		entry["time"] += seconds
+		if counts!=None:
+			for counter, amount in counts.items():
+				entry[counter] = entry.get(counter,0) + amount
+
+	# slowest phases, for the operator report
+	def summary(self, limit=5):
+		phases = sorted(self.phases.items(), key=lambda item: -item[1]["time"])
+		return ", ".join(["{x} {y:.2f}s".format(x=phase, y=entry["time"])
+				for phase, entry in phases[:limit]])
+
+	def save(self, path):
+		data = {"total":time.time()-self.startTime, "phases":self.phases}
+		with open(path, 'w') as log_file:
+			json.dump(data, log_file, indent=1, sort_keys=True)
+
+
 # -----------------------------------------------------------------------------
 # Mesh swap functions
 # -----------------------------------------------------------------------------
@@ -292,6 +504,8 @@ class meshSwap(bpy.types.Operator):
 	#used for only occasionally refreshing the 3D scene while mesh swapping
 	counterObject = 0	# used in count
 	countMax = 5		# count compared to this, frequency of refresh (number of objs)
+	timeBudget = 0.1	# seconds of work per timer event when running interactively
+	poolMinFaces = 50000	# fewer faces than this are planned without worker processes
 
 	# properties for draw
 	meshswap_join = bpy.props.BoolProperty(
@@ -300,8 +514,102 @@ class meshSwap(bpy.types.Operator):
 		description="Join together swapped blocks of the same type (unless swapped with a group)")
 	use_dupliverts = bpy.props.BoolProperty(
 		name="Use dupliverts (faster)",
-		default=True,
-		description="Use dupliverts to add meshes")
+		default=False,
+		description="Instance blocks on the vertices of one carrier object per "+\
+				"block type and rotation, instead of adding an object per block")
+	variance_seed = bpy.props.IntProperty(
+		name="Variance seed",
+		default=0,
+		min=0,
+		description="Seed for random block placement variance and variants, "+\
+				"the same seed gives the same result when re-run")
+	run_modal = bpy.props.BoolProperty(
+		name="Interactive",
+		default=False,
+		description="Swap in the background in small chunks, showing progress "+\
+				"in the header; press Esc to cancel")
+	chunk_size = bpy.props.IntProperty(
+		name="Chunk size",
+		default=16,
+		min=1,
+		description="Width in blocks of the areas placed in one step when "+\
+				"interactive or only swapping changed areas, cancelling "+\
+				"rolls back a partially placed area")
+	limit_region = bpy.props.EnumProperty(
+		name="Limit to",
+		items= [('none', 'Everything', 'Swap all blocks of the selected objects'),
+				('box', 'Box', 'Only swap blocks within the box between the min and max corners'),
+				('camera', 'Camera view', 'Only swap blocks in view of the active camera')],
+		description="Only swap blocks within a region, to skip blocks which won't be seen")
+	region_min = bpy.props.FloatVectorProperty(
+		name="Box min",
+		default=(-32,-32,-32),
+		description="Minimum corner of the box to swap blocks in (global coordinates)")
+	region_max = bpy.props.FloatVectorProperty(
+		name="Box max",
+		default=(32,32,32),
+		description="Maximum corner of the box to swap blocks in (global coordinates)")
+	region_margin = bpy.props.FloatProperty(
+		name="Margin",
+		default=2,
+		min=0,
+		description="Extra distance around the box or camera view to also swap blocks in")
+	occlusion_cull = bpy.props.BoolProperty(
+		name="Skip hidden blocks",
+		default=False,
+		description="Don't place blocks enclosed on all sides by solid blocks, "+\
+				"e.g. buried grass or torches in sealed caves")
+	incremental = bpy.props.BoolProperty(
+		name="Only changed areas",
+		default=False,
+		description="Keep blocks placed by a previous meshswap in areas that "+\
+				"didn't change, e.g. after re-importing an edited world, and "+\
+				"only re-place the areas that did")
+	plan_workers = bpy.props.IntProperty(
+		name="Planning processes",
+		default=0,
+		min=0,
+		description="Worker processes to plan block placement in, 0 uses "+\
+				"all CPU cores and 1 plans without worker processes")
+	use_lod = bpy.props.BoolProperty(
+		name="Level of detail",
+		default=False,
+		description="Use the simpler _LOD1, _LOD2.. variants of blocks in the "+\
+				"meshswap file the farther blocks are from the active camera")
+	lod_distance = bpy.props.FloatProperty(
+		name="LOD distance",
+		default=32,
+		min=1,
+		description="Distance from the active camera after which each next "+\
+				"level of detail variant is used")
+	dry_run = bpy.props.BoolProperty(
+		name="Plan only",
+		default=False,
+		description="Only plan where blocks go, without placing them or "+\
+				"changing the selected objects; use with a plan file")
+	plan_file = bpy.props.StringProperty(
+		name="Plan file",
+		default="",
+		subtype='FILE_PATH',
+		description="If set, export the placement plan (block types, positions "+\
+				"and rotations) to this .npz file, e.g. from a plan only run or "+\
+				"for use in other tools")
+	place_plan = bpy.props.BoolProperty(
+		name="Place from plan",
+		default=False,
+		description="Place the blocks of the plan file instead of planning them "+\
+				"from the selected objects, whose faces are left as they are")
+	log_stats = bpy.props.BoolProperty(
+		name="Log timings",
+		default=False,
+		description="Time each meshswap phase and count faces, blocks and "+\
+				"objects, shown in the report and saved as JSON")
+	stats_file = bpy.props.StringProperty(
+		name="Timings file",
+		default="",
+		subtype='FILE_PATH',
+		description="JSON file to save meshswap timings to, if empty saved "+\
+				"to the temporary directory")
 	link_groups = bpy.props.BoolProperty(
 		name="Link groups",
 		default=False,
@@ -310,15 +618,6 @@ class meshSwap(bpy.types.Operator):
 		name="Prep materials",
 		default=False,
 		description="Automatically apply prep materials (with default settings) to blocks added in")
-	append_layer = bpy.props.IntProperty(
-		name="Append layer",
-		default=20,
-		min=0,
-		max=20,
-		description="When groups are appended instead of linked, "+\
-				"the objects part of the group will be placed in this "+\
-				"layer, 0 means same as active layers")
-	
 	meshswap_lamps = bpy.props.EnumProperty(
 		name="Lamps",
 		items= [('group', 'With groups', 'Repalce light emitting blocks group instances, containing 3D blocks and lamps'),
@@ -352,13 +651,45 @@ class meshSwap(bpy.types.Operator):
 
 		layout.label("GENERAL SETTINGS")
 		row = layout.row()
-		# row.prop(self,"use_dupliverts") # coming soon
+		row.prop(self,"use_dupliverts")
 		row.prop(self,"meshswap_join")
 		row = layout.row()
 		row.prop(self,"link_groups")
 		row.prop(self,"prep_materials")
 		row = layout.row()
-		row.prop(self,"append_layer")
+		row.prop(self,"variance_seed")
+		row = layout.row()
+		row.prop(self,"run_modal")
+		row.prop(self,"chunk_size")
+		row = layout.row()
+		row.prop(self,"plan_workers")
+		row = layout.row()
+		row.prop(self,"occlusion_cull")
+		sub = row.row()
+		sub.enabled = self.limit_region == 'none'
+		sub.prop(self,"incremental")
+		row = layout.row()
+		row.prop(self,"use_lod")
+		row.prop(self,"lod_distance")
+		row = layout.row()
+		row.prop(self,"dry_run")
+		row.prop(self,"place_plan")
+		row = layout.row()
+		row.prop(self,"plan_file")
+		row = layout.row()
+		row.prop(self,"log_stats")
+		row.prop(self,"stats_file")
+
+		layout.split()
+		layout.label("LIMIT REGION")
+		row = layout.row()
+		row.prop(self,"limit_region",expand=True)
+		if self.limit_region == 'box':
+			row = layout.row()
+			row.prop(self,"region_min")
+			row.prop(self,"region_max")
+		if self.limit_region != 'none':
+			layout.prop(self,"region_margin")
 		
 		# multi settings, to come
 		# layout.split()
@@ -377,27 +708,103 @@ class meshSwap(bpy.types.Operator):
 			col.label("consider using a smaller area closer to the camera", icon="BLANK1")
 
 
-	# called for each object in the loop as soon as possible
+	# names of every group and object in the library (or groups already in
+	# the file) the selected materials swap with, as two sets; with variants
+	# also the torch variants and level of detail variants
+	def neededBlocks(self, index, variants=True):
+		addon_prefs = bpy.context.user_preferences.addons[__package__].preferences
+		rmable = removableBlocks.get(addon_prefs.MCprep_exporter_type, [])
+		groups = set()
+		objects = set()
+		for src in self.objList:
+			name = util.nameGeneralize(src["name"])
+			if name in rmable: continue
+			if name in index["group_set"] or name in bpy.data.groups:
+				names = [name]
+				#special cases, make another list for this? number of variants can vary..
+				if variants and (name == "torch" or name == "Torch"):
+					names += [name+".1", name+".2"]
+				if variants and self.use_lod:
+					names += lodNames(index, name, True)[1:]
+				groups.update(names)
+			elif name in index["object_set"]:
+				names = [name]
+				if variants and self.use_lod:
+					names = lodNames(index, name, False)
+				objects.update(names)
+		return groups, objects
+
+	# Work out every group and object the selected materials swap with, and
+	# append (or link) all of them from the library in one transfer, without
+	# operators; the datablocks are kept in self.assets for checkExternal
+	def preloadAssets(self, context):
+		self.assets = {"groups":{}, "objects":{}}
+		index = getLibraryIndex(context.scene.meshswap_path)
+		if index==None: return
+		groups, objects = self.neededBlocks(index)
+
+		# groups already in the file are reused, objects are always appended
+		# as they're removed again once placed
+		for name in groups:
+			if name in bpy.data.groups:
+				self.assets["groups"][name] = bpy.data.groups[name]
+		groups = sorted([name for name in groups
+				if name not in bpy.data.groups and name in index["group_set"]])
+		objects = sorted(objects)
+		if len(groups)+len(objects)==0: return
+
+		path = bpy.path.abspath(context.scene.meshswap_path)
+		if self.link_groups and len(groups)>0:
+			with bpy.data.libraries.load(path, link=True) as (data_from, data_to):
+				data_to.groups = groups
+			loaded = {"groups":data_to.groups}
+			with bpy.data.libraries.load(path, link=False) as (data_from, data_to):
+				data_to.objects = objects
+			loaded["objects"] = data_to.objects
+		else:
+			with bpy.data.libraries.load(path, link=False) as (data_from, data_to):
+				data_to.groups = groups
+				data_to.objects = objects
+			loaded = {"groups":data_to.groups, "objects":data_to.objects}
+
+		# loaded datablocks may be renamed on a clash, so map by requested name
+		for name, group in zip(groups, loaded["groups"]):
+			if group!=None:
+				self.assets["groups"][name] = group
+				self.loadedGroups.append(group)
+		for name, obj in zip(objects, loaded["objects"]):
+			if obj!=None:
+				obj["MCprep_noSwap"] = "True"
+				self.assets["objects"][name] = obj
+		if conf.v:print("Preloaded {x} groups and {y} objects".format(
+				x=len(groups), y=len(objects)))
+
+	# For a plan only run, read the swap properties of the blocks the selected
+	# materials swap with into the library index, without loading anything
+	# into the file; groups already in the file are read directly
+	def readAssetProps(self, context):
+		index = getLibraryIndex(context.scene.meshswap_path)
+		if index==None: return
+		groups, objects = self.neededBlocks(index, variants=False)
+		for name in groups:
+			if name in bpy.data.groups and name not in index["props"]:
+				index["props"][name] = swapPropsFromBlock(bpy.data.groups[name])
+		readLibraryProps(context.scene.meshswap_path, index,
+				[name for name in groups if name not in bpy.data.groups], objects)
+
+	# find what a block swaps with and its swap properties, from the assets
+	# preloaded for this meshswap (or only the library index, if plan only)
 	def checkExternal(self, context, name):
-		if conf.v:print("Checking external library")
 		addon_prefs = bpy.context.user_preferences.addons[__package__].preferences
 		
 		meshSwapPath = context.scene.meshswap_path
-		rmable = []
-		if addon_prefs.MCprep_exporter_type == "jmc2obj":
-			rmable = ['double_plant_grass_top','torch_flame','cactus_side','cactus_bottom','book',
-						'enchant_table_side','enchant_table_bottom','door_iron_top','door_wood_top',
-						'brewing_stand','door_dark_oak_upper','door_acacia_upper','door_jungle_upper',
-						'door_birch_upper','door_spruce_upper','tnt_top','tnt_bottom']
-		elif addon_prefs.MCprep_exporter_type == "Mineways":
-			rmable = [] # Mineways removable objs
-		else:
+		if addon_prefs.MCprep_exporter_type not in removableBlocks:
 			# need to select one of the exporters!
 			return {'CANCELLED'}
+		rmable = removableBlocks[addon_prefs.MCprep_exporter_type]
 		# delete unnecessary ones first
 		if name in rmable:
 			removable = True
-			if conf.v:print("Removable!")
 			return {'removable':removable}
 		groupSwap = False
 		meshSwap = False # if object  is in both group and mesh swap, group will be used
@@ -412,144 +819,179 @@ class meshSwap(bpy.types.Operator):
 		#			['flower_yellow',0], ['flower_red',0] ]
 		variance = [False,0] # needs to be in this structure
 
-		#check the actual name against the library
-		with bpy.data.libraries.load(meshSwapPath) as (data_from, data_to):
-			if name in data_from.groups or name in bpy.data.groups:
-				groupSwap = True
-			elif name in data_from.objects:
-				meshSwap = True
-
-		# now import
-		if conf.v:print("about to link, group/mesh?",groupSwap,meshSwap)
-		toLink = self.link_groups # should read from addon prefs, false by default
-		bpy.ops.object.select_all(action='DESELECT') # context...? ensure in 3d view..
-		#import: guaranteed to have same name as "appendObj" for the first instant afterwards
-		grouped = False # used to check if to join or not
-		importedObj = None		# need to initialize to something, though this obj no used
-		groupAppendLayer = self.append_layer
-		if groupSwap and name not in bpy.data.groups:
-			# if group not linked, put appended group data onto the GUI field layer
-			activeLayers = list(context.scene.layers)
-			if (not toLink) and (groupAppendLayer!=0):
-				x = [False]*20
-				x[groupAppendLayer-1] = True
-				context.scene.layers = x
-			
-			#special cases, make another list for this? number of variants can vary..
-			if name == "torch" or name == "Torch":
-				util.bAppendLink(os.path.join(meshSwapPath,'Group'), name+".1", toLink)
-				bpy.ops.object.delete()
-				util.bAppendLink(os.path.join(meshSwapPath,'Group'), name+".2", toLink)
-				bpy.ops.object.delete()
-			util.bAppendLink(os.path.join(meshSwapPath,'Group'), name, toLink)
-			bpy.ops.object.delete()
-			grouped = True
-			# if activated a different layer, go back to the original ones
-			context.scene.layers = activeLayers
-			grouped = True
-			# set properties
-			for item in bpy.data.groups[name].items():
-				if conf.v:print("GROUP PROPS:",item)
-				try:
-					x = item[1].name #will NOT work if property UI
-				except:
-					x = item[0] # the name of the property, [1] is the value
-					if x=='variance':
-						variance = [tmpName,item[1]]
-					elif x=='edgeFloat':
-						edgeFloat = True
-					elif x=='doorlike':
-						doorlike = True
-					elif x=='edgeFlush':
-						edgeFlush = True
-					elif x=='torchlike':
-						torchlike = True
-					elif x=='removable':
-						removable = True
-		elif groupSwap:
-			# ie already have a local group, so continue but don't import anything
-			grouped = True
-			#set properties
-			for item in bpy.data.groups[name].items():
-				try:
-					x = item[1].name #will NOT work if property UI
-				except:
-					x = item[0] # the name of the property, [1] is the value
-					if x=='variance':
-						variance = [tmpName,item[1]]
-					elif x=='edgeFloat':
-						edgeFloat = True
-					elif x=='doorlike':
-						doorlike = True
-					elif x=='edgeFlush':
-						edgeFlush = True
-					elif x=='torchlike':
-						torchlike = True
-					elif x=='removable':
-						removable = True
-		else:
-			util.bAppendLink(os.path.join(meshSwapPath,'Object'),name, False)
-			### NOTICE: IF THERE IS A DISCREPENCY BETWEEN ASSETS FILE AND WHAT IT SAYS SHOULD
-			### BE IN FILE, EG NAME OF MESH TO SWAP CHANGED,  INDEX ERROR IS THROWN HERE
-			### >> MAKE a more graceful error indication.
-			try:
-				importedObj = bpy.context.selected_objects[0]
-			except:
-				return False #in case nothing selected.. which happens even during selection?
-			importedObj["MCprep_noSwap"] = "True"
-			# now check properties
-			for item in importedObj.items():
-				try:
-					x = item[1].name #will NOT work if property UI
-				except:
-					x = item[0] # the name of the property, [1] is the value
-					if x=='variance':
-						variance = [True,item[1]]
-					elif x=='edgeFloat':
-						edgeFloat = True
-					elif x=='doorlike':
-						doorlike = True
-					elif x=='edgeFlush':
-						edgeFlush = True
-					elif x=='torchlike':
-						torchlike = True
-					elif x=='removable':
-						removable = True
-			bpy.ops.object.select_all(action='DESELECT')
+		#check the actual name against the library index and preloaded assets
+		start = self.stats.start()
+		index = getLibraryIndex(meshSwapPath)
+		if index==None:
+			return False
+		if self.dry_run:
+			groupSwap = name in index["group_set"] or name in bpy.data.groups
+			meshSwap = not groupSwap and name in index["object_set"]
+		elif name in self.assets["groups"]:
+			groupSwap = True
+		elif name in self.assets["objects"]:
+			meshSwap = True
+		self.stats.stop("lookup", start, {"names":1})
+		if not (groupSwap or meshSwap):
+			return False # nothing to swap with, or failed to load
+
+		# level of detail variants, of those that loaded
+		assets = self.assets["groups"] if groupSwap else self.assets["objects"]
+		lods = [name]
+		if self.use_lod and self.dry_run:
+			lods = lodNames(index, name, groupSwap)
+		elif self.use_lod:
+			lods = [lod for lod in lodNames(index, name, groupSwap) if lod in assets]
+		importedObj = None # the object to duplicate, if not a group
+		lodObjects = {name:None}
+		if meshSwap and not self.dry_run:
+			importedObj = assets[name]
+			lodObjects = {lod:assets[lod] for lod in lods}
+			if len(lods)>1:
+				for level, lod in enumerate(lods):
+					# tag the mesh data so placed copies can be re-LOD'ed later;
+					# only these library meshes are marked as a source
+					mesh = lodObjects[lod].data
+					mesh["MCprep_lodBase"] = name
+					mesh["MCprep_lodLevel"] = level
+					mesh["MCprep_lodSource"] = True
+					mesh.use_fake_user = True
+
+		# set properties, reading them off the block once and then from the index
+		if name not in index["props"] and self.dry_run:
+			index["props"][name] = {} # failed to read from the library
+		elif name not in index["props"]:
+			if groupSwap:
+				index["props"][name] = swapPropsFromBlock(assets[name])
+			else:
+				index["props"][name] = swapPropsFromBlock(importedObj)
+		props = index["props"][name]
+		if 'variance' in props:
+			variance = [True,props['variance']]
+		edgeFloat = 'edgeFloat' in props
+		doorlike = 'doorlike' in props
+		edgeFlush = 'edgeFlush' in props
+		torchlike = 'torchlike' in props
+		removable = 'removable' in props
+
 		##### HERE set the other properties, e.g. variance and edgefloat, now that the obj exists
-		if conf.v:print("groupSwap: ",groupSwap,"meshSwap: ",meshSwap)
-		if conf.v:print("edgeFloat: ",edgeFloat,", variance: ",variance,", torchlike: ",torchlike)
 		return {'meshSwap':meshSwap, 'groupSwap':groupSwap,'variance':variance,
 				'edgeFlush':edgeFlush,'edgeFloat':edgeFloat,'torchlike':torchlike,
-				'removable':removable,'object':importedObj,'doorlike':doorlike}
-
-	def offsetByHalf(self,obj):
-		if obj.type != 'MESH': return
-		# bpy.ops.object.mode_set(mode='OBJECT')
-		if conf.v:print("doing offset")
-		# bpy.ops.mesh.select_all(action='DESELECT')
-		active = bpy.context.active_object #preserve current active
-		bpy.context.scene.objects.active  = obj
-		bpy.ops.object.mode_set(mode='EDIT')
-		bpy.ops.mesh.select_all(action='SELECT')
-		bpy.ops.transform.translate(value=(0.5, 0.5, 0.5))
-		bpy.ops.object.mode_set(mode='OBJECT')
-		obj.location[0] -= .5
-		obj.location[1] -= .5
-		obj.location[2] -= .5
-		bpy.context.scene.objects.active = active
-
+				'removable':removable,'object':importedObj,'doorlike':doorlike,
+				'lodNames':lods,'lodObjects':lodObjects}
+
+	# place all blocks of one type as vertices of carrier meshes, one carrier
+	# per rotation code (and group variant), with dupliverts instancing the
+	# swapped object or group at every vertex; returns the carrier objects
+	def placeDupliverts(self, context, swap, swapProps, locList, rotList,
+			names, jitter):
+		if len(locList)==0: return []
+		grouped = swapProps["groupSwap"]
+		rots = np.array(rotList, dtype=int)
+		coords = np.array(locList, dtype=np.float64)
+		coords += meshswap_plan.getRotationRules()["offsets"][rots]
+		coords += jitter
+
+		batches = {}
+		for ind, key in enumerate(zip(names, rotList)):
+			batches.setdefault(key, []).append(ind)
+
+		carriers = []
+		rotBase = baseRotation(swap)
+		for (name, rot), inds in sorted(batches.items()):
+			points = coords[inds].astype(np.float32)
+			mesh = bpy.data.meshes.new(name+"_dupliverts")
+			mesh.vertices.add(len(inds))
+			mesh.vertices.foreach_set("co", points.ravel())
+			mesh.update()
+			carrier = bpy.data.objects.new(name+"_dupliverts", mesh)
+			context.scene.objects.link(carrier)
+			carrier.dupli_type = 'VERTS'
+			carrier["MCprep_noSwap"] = "True"
+			if self.mergeAfter:
+				carrier["MCprep_merge"] = "{x}/{y}".format(x=name, y=rot)
+
+			if grouped:
+				child = bpy.data.objects.new(name, None)
+				child.dupli_type = 'GROUP'
+				child.dupli_group = self.assets["groups"].get(name)
+			else:
+				# copy shares the mesh data, of the level of detail variant
+				child = swapProps["lodObjects"].get(name, swapProps["object"]).copy()
+			context.scene.objects.link(child)
+			child.parent = carrier
+			child.location = (0,0,0)
+			rotation = meshswap_plan.rotationTransform(rot)[1]
+			child.rotation_euler = [rotBase[i]+rotation[i] for i in range(3)]
+			child.scale = swap.scale
+			child["MCprep_noSwap"] = "True"
+			carriers.append(carrier)
+
+		return carriers
+
+	# place all blocks of one type as a single mesh, reading the base mesh once
+	# and tiling its geometry with per-block transforms, equivalent to
+	# duplicating the base per block and joining; returns the new object
+	def placeMerged(self, context, swap, swapGen, base, locList, rotList,
+			jitter):
+		if len(locList)==0: return []
+		src = base.data
+		nVerts = len(src.vertices)
+		nLoops = len(src.loops)
+		nPolys = len(src.polygons)
+		count = len(locList)
+
+		verts = np.empty(nVerts*3, dtype=np.float32)
+		src.vertices.foreach_get("co", verts)
+		verts = verts.reshape(nVerts,3).astype(np.float64)*np.array(swap.scale)
+		loopVerts = np.empty(nLoops, dtype=np.int32)
+		src.loops.foreach_get("vertex_index", loopVerts)
+		loopStart = np.empty(nPolys, dtype=np.int32)
+		src.polygons.foreach_get("loop_start", loopStart)
+		loopTotal = np.empty(nPolys, dtype=np.int32)
+		src.polygons.foreach_get("loop_total", loopTotal)
+		matIndex = np.empty(nPolys, dtype=np.int32)
+		src.polygons.foreach_get("material_index", matIndex)
+		smooth = np.empty(nPolys, dtype=bool)
+		src.polygons.foreach_get("use_smooth", smooth)
+		uvs = []
+		for layer in src.uv_layers:
+			uv = np.empty(nLoops*2, dtype=np.float32)
+			layer.data.foreach_get("uv", uv)
+			uvs.append((layer.name, uv))
+
+		coords, loopVerts, loopStart = meshswap_plan.tileMesh(verts, loopVerts,
+				loopStart, locList, rotList, jitter, baseRotation(swap))
+
+		mesh = bpy.data.meshes.new(swapGen)
+		mesh.vertices.add(count*nVerts)
+		mesh.vertices.foreach_set("co", coords)
+		mesh.loops.add(count*nLoops)
+		mesh.loops.foreach_set("vertex_index", loopVerts)
+		mesh.polygons.add(count*nPolys)
+		mesh.polygons.foreach_set("loop_start", loopStart)
+		mesh.polygons.foreach_set("loop_total", np.tile(loopTotal, count))
+		mesh.polygons.foreach_set("material_index", np.tile(matIndex, count))
+		mesh.polygons.foreach_set("use_smooth", np.tile(smooth, count))
+		for name, uv in uvs:
+			mesh.uv_textures.new(name)
+			mesh.uv_layers[name].data.foreach_set("uv", np.tile(uv, count))
+		for mat in src.materials:
+			mesh.materials.append(mat)
+		mesh.update(calc_edges=True)
+
+		obj = bpy.data.objects.new(base.name, mesh)
+		context.scene.objects.link(obj)
+		obj["MCprep_noSwap"] = "True"
+		return [obj]
 
 	def execute(self, context):
 
 		# 
 		tracking.trackUsage("meshswap",None)
 
-		runcount = 0 # counter.. if zero by end, raise error that no selected objects matched
 		## debug, restart check
 		if conf.v:print('###################################')
-		addon_prefs = bpy.context.user_preferences.addons[__package__].preferences
-		# if checkOptin():usageStat('meshSwap'+':'+addon_prefs.MCprep_exporter_type)
 		direc = context.scene.meshswap_path
 		
 		#check library file exists
@@ -560,30 +1002,128 @@ class meshSwap(bpy.types.Operator):
 			if not os.path.isfile(direc):
 				self.report({'ERROR'}, "Mesh swap blend file not found!") # better, actual "error"
 				return {'CANCELLED'}
-		
-		# get some scene information
-		toLink = False #context.scene.MCprep_linkGroup
-		groupAppendLayer = self.append_layer
-		activeLayers = list(context.scene.layers) ## NEED TO BE PASSED INTO the thing.
-		# along with the scene name
+
+		if self.place_plan and self.dry_run:
+			self.report({'ERROR'}, "Can't place from a plan when only planning")
+			return {'CANCELLED'}
+		if self.place_plan and not os.path.isfile(bpy.path.abspath(self.plan_file)):
+			self.report({'ERROR'}, "Meshswap plan file not found")
+			return {'CANCELLED'}
+		if self.limit_region == 'camera' and context.scene.camera == None:
+			self.report({'ERROR'}, "No active camera to limit meshswap to")
+			return {'CANCELLED'}
+		if self.use_lod and context.scene.camera == None:
+			self.report({'ERROR'}, "No active camera for level of detail distances")
+			return {'CANCELLED'}
+
+		# blocks are only placed chunk by chunk when running interactively, to
+		# roll back a cancelled chunk, or when only re-placing changed chunks;
+		# otherwise each block type is placed all at once
+		self.interactive = self.run_modal and context.window!=None and context.area!=None
+		# with a limited region, chunks cut by its border are only partly
+		# planned, and would wrongly look changed; so only for everything
+		self.useIncremental = self.incremental and self.limit_region == 'none'
+		if self.incremental and not self.useIncremental:
+			self.report({'WARNING'}, "Only changed areas is not used with a limited region")
+		self.chunked = self.interactive or self.useIncremental
+		# interactive chunks of each block type are joined again when done
+		self.mergeAfter = self.interactive and not self.useIncremental
+
+		self.stats = MeshswapStats(self.log_stats)
+		self.setupSwap(context)
+		self.steps = self.swapSteps(context)
+
+		# interactive, do a time limited slice of the steps per timer event
+		if self.interactive:
+			self.area = context.area
+			self._timer = context.window_manager.event_timer_add(
+					0.05, context.window)
+			context.window_manager.progress_begin(0, 100)
+			context.window_manager.modal_handler_add(self)
+			return {'RUNNING_MODAL'}
+
+		for step in self.steps:
+			pass
+		return self.finishSwap(context)
+
+	def modal(self, context, event):
+		if event.type == 'ESC':
+			return self.finishSwap(context, cancelled=True)
+		elif event.type != 'TIMER':
+			return {'PASS_THROUGH'}
+
+		start = time.time()
+		try:
+			while time.time()-start < self.timeBudget:
+				next(self.steps)
+		except StopIteration:
+			return self.finishSwap(context)
+		self.updateProgress(context)
+		return {'RUNNING_MODAL'}
+
+	# read the selected objects and split them into per-material swap sources
+	def setupSwap(self, context):
+		addon_prefs = bpy.context.user_preferences.addons[__package__].preferences
 		doOffset = (addon_prefs.MCprep_exporter_type == "Mineways")
-		#separate each material into a separate object
-		#is this good practice? not sure what's better though
-		# could also recombine similar materials here, so happens just once.
-		selList = context.selected_objects
-		for obj in selList:
+		self.runcount = 0 # counter.. if zero by end, raise error that no selected objects matched
+		self.blocksTotal = 0
+		self.jobs = []
+		self.chunkObjs = [] # objects of the chunk being placed, for rollback
+		self.placed = [] # objects of all finished chunks
+		self.keptChunks = 0 # unchanged chunks skipped when incremental
+		self.changed = False # if any chunk was placed or old blocks removed
+		self.loadedGroups = [] # groups appended by this meshswap
+		self.planEntries = [] # planned blocks per material, for the plan file
+		self.assets = {"groups":{}, "objects":{}} # preloaded from the library
+		self.startTime = time.time()
+		self.placeStart = None
+
+		# read each selected object's faces once and split them up by material
+		# index, rather than separating into a new object per material
+		self.selList = list(context.selected_objects)
+		# if mineways/necessary, blocks are planned from face centers shifted by
+		# half a block and placed shifted back, leaving the meshes unchanged
+		self.blockShift = 0.5 if doOffset else 0 # global to whole block coords
+		self.readChunkRecords(context)
+		if self.place_plan:
+			self.setupPlan(context)
+			return
+		if not self.dry_run:
 			try: bpy.ops.object.convert(target='MESH')
 			except: pass
-			bpy.ops.mesh.separate(type='MATERIAL')
-		# now do type checking and fix any name discrepencies
-		objList = []
-		for obj in selList:
-			#ignore non mesh selected objects or objs labeled to not double swap
-			if obj.type != 'MESH' or ("MCprep_noSwap" in obj): continue
-			if obj.active_material == None: continue
-			obj.data.name = obj.active_material.name
-			obj.name = obj.active_material.name
-			objList.append(obj) 
+		#ignore non mesh selected objects or objs labeled to not double swap
+		self.worldList = [obj for obj in self.selList
+				if obj.type == 'MESH' and "MCprep_noSwap" not in obj]
+		self.localShift = {} # world object name: local offset of blockShift
+		self.faceData = {} # world object name: centers, normals, areas, mat index
+		self.removeFaces = {} # world object name: arrays of faces to remove after
+		self.objList = [] # one entry per material of each world object
+		for obj in self.worldList:
+			start = self.stats.start()
+			self.faceData[obj.name] = getFaceArrays(obj)
+			offset = meshswap_plan.halfBlockOffset(obj.matrix_world) \
+					if doOffset else None
+			self.localShift[obj.name] = offset if offset is not None else np.zeros(3)
+			self.removeFaces[obj.name] = []
+			self.stats.stop("faces", start, {"faces":len(self.faceData[obj.name][3])})
+			# only faces in the limited region get swapped, rest left as is
+			start = self.stats.start()
+			inside = np.nonzero(self.regionMask(context, obj,
+					self.faceData[obj.name][0]))[0]
+			for slot, faces in splitByMaterial(self.faceData[obj.name][3][inside]):
+				faces = inside[faces]
+				if slot >= len(obj.material_slots): continue
+				if obj.material_slots[slot].material == None: continue
+				self.objList.append({"object":obj, "faces":faces,
+						"name":obj.material_slots[slot].material.name})
+			self.stats.stop("separate", start, {"faces":len(inside)})
+
+		# occupancy of solid blocks, for skipping blocks enclosed by them
+		self.occupied = None
+		if self.occlusion_cull:
+			start = self.stats.start()
+			self.occupied = self.solidOccupancy()
+			self.stats.stop("occlusion", start)
 
 		#listData = self.getListData() # legacy, no longer doing this
 		# global scale, WIP
@@ -595,335 +1135,617 @@ class meshSwap(bpy.types.Operator):
 		# # gScale = estimateScale(objList[0].data.polygons.values())
 		# gScale = estimateScale(faces)
 		if conf.v: print("Using scale: ", gScale)
-		if conf.v:print(objList)
-
-		#primary loop, for each OBJECT needing swapping
-		for swap in objList:
-			swapGen = util.nameGeneralize(swap.name)
-			if conf.v:print("Simplified name: {x}".format(x=swapGen))
-			swapProps = self.checkExternal(context,swapGen) # IMPORTS, gets lists properties, etc
-			if swapProps == False: # error happened in swapProps, e.g. not a mesh or something
-				continue
-			#special cases, for "extra" mesh pieces we don't want around afterwards
-			if swapProps['removable']:
-				bpy.ops.object.select_all(action='DESELECT')
-				swap.select = True
-				bpy.ops.object.delete()
-				continue
-			#just selecting mesh with same name accordinly.. ALSO only if in objList
-			if not (swapProps['meshSwap'] or swapProps['groupSwap']): continue
-			if conf.v: print("Swapping '{x}', simplified name '{y}".format(x=swap.name, y=swapGen))
-			# if mineways/necessary, offset mesh by a half. Do it on a per object basis.
-			if doOffset:
-				self.offsetByHalf(swap)
-				# try:offsetByHalf(swap)
-				# except: print("ERROR in offsetByHalf, verify swapped meshes for ",swap.name)
-
-			worldMatrix = swap.matrix_world.copy() #set once per object
-			polyList = swap.data.polygons.values() #returns LIST of faces.
-			#print(len(polyList)) # DON'T USE POLYLIST AFTER AFFECTING THE MESH
-			for poly in range(len(polyList)):
-				swap.data.polygons[poly].select = False
-			#loop through each face or "polygon" of mesh
-			facebook = [] #what? it's where I store the information of the obj's faces..
-			for polyIndex in range(0,len(polyList)):
-				gtmp = swap.matrix_world*mathutils.Vector(swap.data.polygons[polyIndex].center)
-				g = [gtmp[0],gtmp[1],gtmp[2]]
-				n = swap.data.polygons[polyIndex].normal
-				tmp2 = swap.data.polygons[polyIndex].center
-				l = [tmp2[0],tmp2[1],tmp2[2]] #to make value unlinked to mesh
-				if swap.data.polygons[polyIndex].area < 0.016 and swap.data.polygons[polyIndex].area > 0.015:
-					continue # hack for not having too many torches show up, both jmc2obj and Mineways
-				facebook.append([n,g,l]) # g is global, l is local
-			bpy.ops.object.select_all(action='DESELECT')
-			
-			# removing duplicates and checking orientation
-			dupList = []	#where actual blocks are to be added
-			rotList = []	#rotation of blocks
-			for setNum in range(0,len(facebook)):
-				# LOCAL coordinates!!!
-				x = round(facebook[setNum][2][0]) #since center's are half ints.. 
-				y = round(facebook[setNum][2][1]) #don't need (+0.5) -.5 structure
-				z = round(facebook[setNum][2][2])
-				
-				outsideBool = -1
-				if (swapProps['edgeFloat']): outsideBool = 1
-				
-				if util.onEdge(facebook[setNum][2]): #check if face is on unit block boundary (local coord!)
-					a = facebook[setNum][0][0] * 0.4 * outsideBool #x normal
-					b = facebook[setNum][0][1] * 0.4 * outsideBool #y normal
-					c = facebook[setNum][0][2] * 0.4 * outsideBool #z normal
-					x = round(facebook[setNum][2][0]+a) 
-					y = round(facebook[setNum][2][1]+b)
-					z = round(facebook[setNum][2][2]+c)
-					#print("ON EDGE, BRO! line, "+str(x) +","+str(y)+","+str(z))
-					#print([facebook[setNum][2][0], facebook[setNum][2][1], facebook[setNum][2][2]])	
-				
-				#### TORCHES, hack removes duplicates while not removing "edge" floats
-				# if facebook[setNum][2][1]+0.5 - math.floor(facebook[setNum][2][1]+0.5) < 0.3:
-				# 	#continue if coord. is < 1/3 of block height, to do with torch's base in wrong cube.
-				# 	if not swapProps['edgeFloat']:
-				# 		#continue
-				# 		print("do nothing, this is for jmc2obj")	
-				if conf.v:print(" DUPLIST: ")
-				if conf.v:print([x,y,z], [facebook[setNum][2][0], facebook[setNum][2][1], facebook[setNum][2][2]])
-				
-				### START HACK PATCH, FOR MINEWAYS double-tall adding
-				# prevent double high grass... which mineways names sunflowers.
-				overwrite = 0 # 0 means normal, -1 means skip, 1 means overwrite the one below
-				if ([x,y-1,z] in dupList) and swapGen in ["Sunflower","Iron_Door","Wooden_Door"]:
-					overwrite = -1
-				elif ([x,y+1,z] in dupList) and swapGen in ["Sunflower","Iron_Door","Wooden_Door"]:
-					dupList[ dupList.index([x,y+1,z]) ] = [x,y,z]
-					overwrite = -1
-				### END HACK PATCH
-
-				# rotation value (second append value: 0 means nothing, rest 1-4.
-				if ((not [x,y,z] in dupList) or (swapProps['edgeFloat'])) and overwrite >=0:
-					# append location
-					dupList.append([x,y,z])
-					# check differece from rounding, this gets us the rotation!
-					x_diff = x-facebook[setNum][2][0]
-					#print(facebook[setNum][2][0],x,x_diff)
-					z_diff = z-facebook[setNum][2][2]
-					#print(facebook[setNum][2][2],z,z_diff)
-					
-					# append rotation, exporter dependent
-					if addon_prefs.MCprep_exporter_type == "jmc2obj":
-						if swapProps['torchlike']: # needs fixing
-							if (x_diff>.1 and x_diff < 0.4):
-								rotList.append(1)
-							elif (z_diff>.1 and z_diff < 0.4):	
-								rotList.append(2)
-							elif (x_diff<-.1 and x_diff > -0.4):	
-								rotList.append(3)
-							elif (z_diff<-.1 and z_diff > -0.4):
-								rotList.append(4)
-							else:
-								rotList.append(0)
-						elif swapProps['edgeFloat']:
-							if (y-facebook[setNum][2][1] < 0):
-								rotList.append(8)
-							elif (x_diff > 0.3):
-								rotList.append(7)
-							elif (z_diff > 0.3):	
-								rotList.append(0)
-							elif (z_diff < -0.3):
-								rotList.append(6)
-							else:
-								rotList.append(5)
-						elif swapProps['edgeFlush']:
-							# actually 6 cases here, can need rotation below...
-							# currently not necessary/used, so not programmed..	 
-							rotList.append(0)
-						elif swapProps['doorlike']:
-							if (y-facebook[setNum][2][1] < 0):
-								rotList.append(8)
-							elif (x_diff > 0.3):
-								rotList.append(7)
-							elif (z_diff > 0.3):	
-								rotList.append(0)
-							elif (z_diff < -0.3):
-								rotList.append(6)
-							else:
-								rotList.append(5)
-						else:
-							rotList.append(0)
-					elif addon_prefs.MCprep_exporter_type == "Mineways":
-						if conf.v:print("checking:",x_diff,z_diff)
-						if swapProps['torchlike']: # needs fixing
-							if conf.v:print("recognized it's a torchlike obj..")
-							if (x_diff>.1 and x_diff < 0.6):
-								rotList.append(1)
-								#print("rot 1?")	
-							elif (z_diff>.1 and z_diff < 0.6):	
-								rotList.append(2)
-								#print("rot 2?")	
-							elif (x_diff<-.1 and x_diff > -0.6):
-								#print("rot 3?")	
-								rotList.append(3)
-							elif (z_diff<-.1 and z_diff > -0.6):
-								rotList.append(4)
-								#print("rot 4?")	
-							else:
-								rotList.append(0)
-								#print("rot 0?")	
-						elif swapProps['edgeFloat']:
-							if (y-facebook[setNum][2][1] < 0):
-								rotList.append(8)
-							elif (x_diff > 0.3):
-								rotList.append(7)
-							elif (z_diff > 0.3):	
-								rotList.append(0)
-							elif (z_diff < -0.3):
-								rotList.append(6)
-							else:
-								rotList.append(5)
-						elif swapProps['edgeFlush']:
-							# actually 6 cases here, can need rotation below...
-							# currently not necessary/used, so not programmed..	 
-							rotList.append(0)
-						elif swapProps['doorlike']:
-							if (y-facebook[setNum][2][1] < 0):
-								rotList.append(8)
-							elif (x_diff > 0.3):
-								rotList.append(7)
-							elif (z_diff > 0.3):	
-								rotList.append(0)
-							elif (z_diff < -0.3):
-								rotList.append(6)
-							else:
-								rotList.append(5)
-						else:
-							rotList.append(0)
-					else:
-						rotList.append(0)
-
-			##### OPTION HERE TO SEGMENT INTO NEW FUNCTION
-			if conf.v:print("### > trans")
-			bpy.ops.object.select_all(action='DESELECT')
-			base = swapProps["object"]
-			grouped = swapProps["groupSwap"]
-			#self.counterObject = 0
-			# duplicating, rotating and moving
-			dupedObj = []
-			for (set,rot) in zip(dupList,rotList):
-				
-				### HIGH COMPUTATION/CRITICAL SECTION
-				#refresh the scene every once in awhile
-				self.counterObject+=1
-				runcount +=1
-				if (self.counterObject > self.countMax):
-					self.counterObject = 0
-					#below technically a "hack", should use: bpy.data.scenes[0].update()
-					bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
 
-				
-				loc = swap.matrix_world*mathutils.Vector(set) #local to global
-				if grouped:
-					# definition for randimization, defined at top!
-					randGroup = util.randomizeMeshSawp(swapGen,3)
-					
-					# The built in method fails, bpy.ops.object.group_instance_add(...)
-					#UPDATE: I reported the bug, and they fixed it nearly instantly =D
-					# but it was recommended to do the below anyways.
-					util.addGroupInstance(randGroup,loc)
-					
+	# swap sources from the blocks of a plan file rather than the selected
+	# objects, one per block type of each world object the plan was made for
+	def setupPlan(self, context):
+		plan = meshswap_plan.loadPlan(bpy.path.abspath(self.plan_file))
+		self.worldList = []
+		self.objList = []
+		self.removeFaces = {}
+		missing = 0
+		for objInd, name in enumerate(plan["objects"]):
+			obj = bpy.data.objects.get(name)
+			inObject = plan["objectIds"]==objInd
+			if obj==None:
+				missing += int(inObject.sum())
+				continue
+			self.removeFaces[obj.name] = []
+			for typeInd, swapGen in enumerate(plan["names"]):
+				mask = inObject & (plan["types"]==typeInd)
+				if not mask.any(): continue
+				self.objList.append({"object":obj, "name":swapGen,
+						"faces":np.zeros(0, dtype=np.int64),
+						"planned":(plan["positions"][mask].astype(np.int64),
+							plan["rotations"][mask].astype(int), np.zeros((0,3)))})
+		if missing>0:
+			self.report({'WARNING'}, ("Skipped {x} planned blocks of objects "+\
+					"not in this file").format(x=missing))
+		self.occupied = None # occlusion was already culled when planning
+
+	# objects and placement fingerprints of previous meshswaps per chunk key
+	def readChunkRecords(self, context):
+		addon_prefs = bpy.context.user_preferences.addons[__package__].preferences
+		records = context.scene.get("MCprep_meshswap_chunks")
+		self.chunkRecords = records.to_dict() if records!=None else {}
+		self.chunkIndex = {}
+		for obj in context.scene.objects:
+			if "MCprep_chunk" in obj:
+				self.chunkIndex.setdefault(obj["MCprep_chunk"], []).append(obj)
+		self.seenChunks = set()
+		self.coveredCells = set() # global chunk coords planned this run
+		index = getLibraryIndex(context.scene.meshswap_path)
+		self.swapSettings = "{a}/{b}/{c}/{d}/{e}".format(
+				a=index["mtime"] if index else 0, b=self.use_dupliverts,
+				c=self.meshswap_join, d=self.link_groups,
+				e=addon_prefs.MCprep_exporter_type)
+
+	# packed keys of all solid blocks in the selected objects, in global block
+	# coordinates; a solid block is found from any of its exported faces
+	def solidOccupancy(self):
+		keys = [np.zeros(0, dtype=np.int64)]
+		for obj in self.worldList:
+			centers, normals, areas, matIndex = self.faceData[obj.name]
+			isSolid = np.zeros(max(len(obj.material_slots),1), dtype=bool)
+			for i, sl in enumerate(obj.material_slots):
+				isSolid[i] = sl.material!=None and \
+					'solid' in materials.materialCategories(sl.material.name)
+			faces = isSolid[np.minimum(matIndex, len(isSolid)-1)]
+			# normals to global, then step half a block inwards from each face
+			worldNormals = normals[faces].dot(
+					np.linalg.inv(np.array(obj.matrix_world.to_3x3())))
+			worldNormals /= np.linalg.norm(worldNormals, axis=1)[:,None]
+			points = meshswap_plan.matrixApply(obj.matrix_world, centers[faces])
+			keys.append(meshswap_plan.packKeys(np.round(
+					points - worldNormals*0.5 + self.blockShift)))
+		return np.unique(np.concatenate(keys))
+
+	# mask of an object's faces (local face centers) within the region to swap
+	def regionMask(self, context, obj, centers):
+		if self.limit_region == 'none':
+			return np.ones(len(centers), dtype=bool)
+		points = meshswap_plan.matrixApply(obj.matrix_world, centers)
+		if self.limit_region == 'box':
+			return meshswap_plan.boxMask(points, self.region_min,
+					self.region_max, self.region_margin)
+		cam = context.scene.camera
+		return meshswap_plan.frustumMask(points, cam.matrix_world.inverted(),
+				[list(corner) for corner in cam.data.view_frame(context.scene)],
+				cam.data.type == 'ORTHO', cam.data.clip_start,
+				cam.data.clip_end, self.region_margin)
+
+	# generator running the whole meshswap, yielding after each unit of work:
+	# first every material is planned, then blocks are placed chunk by chunk
+	def swapSteps(self, context):
+		# all needed groups and objects are loaded from the library up front,
+		# or when only planning just their swap properties are read
+		start = self.stats.start()
+		if self.dry_run:
+			self.readAssetProps(context)
+		else:
+			self.preloadAssets(context)
+		self.stats.stop("append", start, {"groups":len(self.assets["groups"]),
+				"objects":len(self.assets["objects"])})
+		yield
+
+		# swap properties need bpy, so are read here first
+		sources = []
+		for src in self.objList:
+			if self.readSource(context, src):
+				sources.append(src)
+			yield
+
+		# planning blocks only needs the face arrays, so can be fanned out to
+		# worker processes; waiting on them still yields to stay interactive
+		pool = self.planPool(sources)
+		try:
+			if pool!=None:
+				futures = [pool.submit(meshswap_plan.planBlocksTimed,
+						*self.planArgs(src)) for src in sources]
+			for ind, src in enumerate(sources):
+				if "planned" in src:
+					# placing from a plan file, already planned
+					planned, timings = src["planned"], None
+				elif pool!=None:
+					while True:
+						try:
+							planned, timings = futures[ind].result(timeout=0.05)
+							break
+						except concurrent.futures.TimeoutError:
+							yield
 				else:
-					#sets location of current selection, imported object or group from above
-					base.select = True		# select the base object # UPDATE: THIS IS THE swapProps.object
-					bpy.ops.object.duplicate(linked=False, mode='TRANSLATION')
-					bpy.context.selected_objects[-1].location = mathutils.Vector(loc)
-					# next line hackish....
-					dupedObj.append(bpy.context.selected_objects[-1])
-					base.select = False
-				
-				#still hackish
-				obj = bpy.context.selected_objects[-1]	
-				# do extra transformations now as necessary
-				obj.rotation_euler = swap.rotation_euler
-				# special case of un-applied, 90(+/- 0.01)-0-0 rotation on source (y-up conversion)
-				if (swap.rotation_euler[0]>= math.pi/2-.01 and swap.rotation_euler[0]<= math.pi/2+.01
-					and swap.rotation_euler[1]==0 and swap.rotation_euler[2]==0):
-					obj.rotation_euler[0] -= math.pi/2
-				obj.scale = swap.scale	
-				
-				#rotation/translation for walls, assumes last added object still selected
-				x,y,offset,rotValue,z = 0,0,0.28,0.436332,0.12
-				
-				if rot == 1:
-					# torch rotation 1
-					x = -offset
-					obj.location += mathutils.Vector((x, y, z))
-					obj.rotation_euler[1]+=rotValue
-				elif rot == 2:
-					# torch rotation 2
-					y = offset
-					obj.location += mathutils.Vector((x, y, z))
-					obj.rotation_euler[0]+=rotValue
-				elif rot == 3:
-					# torch rotation 3
-					x = offset
-					obj.location += mathutils.Vector((x, y, z))
-					obj.rotation_euler[1]-=rotValue
-				elif rot == 4:
-					# torch rotation 4
-					y = -offset
-					obj.location += mathutils.Vector((x, y, z))
-					obj.rotation_euler[0]-=rotValue
-				elif rot == 5:
-					# edge block rotation 1
-					obj.rotation_euler[2]+= -math.pi/2
-				elif rot == 6:
-					# edge block rotation 2
-					obj.rotation_euler[2]+= math.pi
-				elif rot == 7:
-					# edge block rotation 3
-					obj.rotation_euler[2]+= math.pi/2
-				elif rot==8:
-					# edge block rotation 4 (ceiling, not 'keep same')
-					obj.rotation_euler[0]+= math.pi/2
-					
-				# extra variance to break up regularity, e.g. for tall grass
-				# first, xy and z variance
-				if [True,1] == swapProps['variance']:
-					x = (random.random()-0.5)*0.5
-					y = (random.random()-0.5)*0.5
-					z = (random.random()/2-0.5)*0.6
-					obj.location += mathutils.Vector((x, y, z))
-				# now for just xy variance, base stays the same
-				elif [True,0] == swapProps['variance']: # for non-z variance
-					x = (random.random()-0.5)*0.5	 # values LOWER than *1.0 make it less variable
-					y = (random.random()-0.5)*0.5
-					obj.location += mathutils.Vector((x, y, 0))
-				bpy.ops.object.select_all(action='DESELECT')
+					timings = {} if self.stats.enabled else None
+					planned = meshswap_plan.planBlocks(*self.planArgs(src),
+							timings=timings)
+				if self.stats.enabled and timings!=None:
+					self.stats.add("rotation", timings["rotation"])
+					self.stats.add("dedup", timings["dedup"],
+							{"faces":len(src["faces"]), "blocks":len(planned[0])})
+				job = self.planMaterial(context, src, planned)
+				self.jobs.append(job)
+				self.blocksTotal += len(job["locList"])
+				yield
+		finally:
+			if pool!=None:
+				for future in futures:
+					future.cancel()
+				# don't block the UI on a plan already running, it's discarded
+				pool.shutdown(wait=False)
+
+		if self.plan_file!="" and not self.place_plan:
+			meshswap_plan.savePlan(bpy.path.abspath(self.plan_file),
+					meshswap_plan.makePlan(self.planEntries))
+			if conf.v:print("Saved meshswap plan: "+self.plan_file)
+		if self.dry_run:
+			return
+
+		self.placeStart = time.time()
+		for job in self.jobs:
+			for chunk in job["chunks"]:
+				key = chunk["key"] if self.useIncremental else None
+				if key!=None:
+					self.seenChunks.add(key)
+					self.coveredCells.add(chunk["cell"])
+				if key!=None and key in self.chunkIndex and \
+						self.chunkRecords.get(key)==chunk["fingerprint"]:
+					# unchanged since the last meshswap, keep what was placed
+					self.removeFaces[job["object"].name].append(chunk["faces"])
+					self.blocksTotal -= len(chunk["blocks"])
+					self.keptChunks += 1
+					continue
+				for step in self.placeChunk(context, job, chunk):
+					yield
+				# chunk complete, keep it and its faces get removed at the end
+				self.removeFaces[job["object"].name].append(chunk["faces"])
+				if key!=None:
+					for obj in self.chunkObjs:
+						obj["MCprep_chunk"] = key
+						obj["MCprep_chunkCell"] = chunk["cell"]
+						obj["MCprep_chunkSize"] = self.chunk_size
+					self.removeObjects(self.chunkIndex.pop(key, []))
+					self.chunkRecords[key] = chunk["fingerprint"]
+				self.placed += self.chunkObjs
+				self.changed = True
+				self.chunkObjs = []
+				yield
+
+		# delete previously placed chunks not planned again in an area this run
+		# covers, e.g. a torch broken in the edit, or chunks of another size
+		if self.useIncremental:
+			for key in list(self.chunkIndex):
+				obj = self.chunkIndex[key][0]
+				if key in self.seenChunks or "MCprep_chunkCell" not in obj:
+					continue
+				cells = meshswap_plan.overlappingCells(list(obj["MCprep_chunkCell"]),
+						obj["MCprep_chunkSize"], self.chunk_size)
+				if any([cell in self.coveredCells for cell in cells]):
+					self.removeObjects(self.chunkIndex.pop(key))
+					self.changed = True
+					self.chunkRecords.pop(key, None)
+
+	# find what a material swaps with, importing it; returns False if there
+	# is nothing to place, otherwise sets the source's swapGen and swapProps
+	def readSource(self, context, src):
+		swap = src["object"]
+		start = self.stats.start()
+		swapGen = util.nameGeneralize(src["name"])
+		self.stats.stop("generalize", start)
+		swapProps = self.checkExternal(context,swapGen) # IMPORTS, gets lists properties, etc
+		if swapProps == False: # error happened in swapProps, e.g. not a mesh or something
+			return False
+		#special cases, for "extra" mesh pieces we don't want around afterwards
+		if swapProps['removable']:
+			self.removeFaces[swap.name].append(src["faces"])
+			return False
+		#just selecting mesh with same name accordinly.. ALSO only if in objList
+		if not (swapProps['meshSwap'] or swapProps['groupSwap']): return False
+		src["swapGen"] = swapGen
+		src["swapProps"] = swapProps
+		return True
+
+	# arguments of meshswap_plan.planBlocks for a source, only plain arrays and
+	# values so they can be sent to a worker process
+	def planArgs(self, src):
+		addon_prefs = bpy.context.user_preferences.addons[__package__].preferences
+		# this material's faces, from the face data read once per object
+		centers, normals, areas, matIndex = self.faceData[src["object"].name]
+		faces = src["faces"]
+		props = {key:src["swapProps"][key] for key in
+				["edgeFloat","torchlike","doorlike","edgeFlush"]}
+		return (centers[faces]+self.localShift[src["object"].name],
+				normals[faces], areas[faces],
+				addon_prefs.MCprep_exporter_type, props,
+				src["swapGen"] in ["Sunflower","Iron_Door","Wooden_Door"])
+
+	# process pool to plan sources in, or None to plan on this process; needs
+	# fork, as spawned workers would start another Blender, and small swaps
+	# aren't worth the overhead
+	def planPool(self, sources):
+		workers = self.plan_workers
+		if workers==0:
+			workers = os.cpu_count() or 1
+		workers = min(workers, len(sources))
+		if workers<=1: return None
+		if sum([len(src["faces"]) for src in sources]) < self.poolMinFaces:
+			return None
+		# without fixing the start method for the rest of blender, the first of
+		# all methods is the platform default
+		method = multiprocessing.get_start_method(allow_none=True)
+		if method==None:
+			method = multiprocessing.get_all_start_methods()[0]
+		if method!='fork': return None
+		if conf.v:print("Planning meshswap with {x} processes".format(x=workers))
+		return concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+
+	# turn a source's planned blocks into placement jobs, in local block
+	# coordinates of the swapped object, split up into spatial chunks
+	def planMaterial(self, context, src, planned):
+		swap = src["object"]
+		swapGen = src["swapGen"]
+		swapProps = src["swapProps"]
+		allFaces = src["faces"]
+		dupList, rotList, faceBlocks = planned
+
+		# occlusion, chunks, variants and levels of detail only need arrays
+		lods = swapProps["lodNames"]
+		variants = util.meshSwapVariants(swapGen,3) if swapProps["groupSwap"] \
+				else [swapGen]
+		timings = {}
+		placement = meshswap_plan.placementPlan(dupList, rotList, faceBlocks,
+				swap.matrix_world, self.blockShift, swapGen,
+				swapProps['variance'], variants, self.variance_seed,
+				self.chunk_size, settings=self.swapSettings,
+				occupied=self.occupied, lodNames=lods,
+				camera=context.scene.camera.matrix_world.translation \
+					if len(lods)>1 else None,
+				lodDistance=self.lod_distance, chunked=self.chunked,
+				timings=timings)
+		if self.occupied is not None:
+			self.stats.add("occlusion", timings["occlusion"],
+					{"hidden":placement["hidden"]})
+		self.stats.add("chunks", timings["chunks"])
+		self.stats.add("transform", timings["transform"])
+		for chunk in placement["chunks"]:
+			chunk["faces"] = allFaces[chunk["faces"]]
+		self.planEntries.append({"object":swap.name,
+				"matrix":placement["matrix"].tolist(), "name":swapGen,
+				"blocks":placement["blocks"], "rotations":placement["rotList"]})
+		return {"object":swap, "swapGen":swapGen, "swapProps":swapProps,
+				"locList":placement["locList"], "rotList":placement["rotList"],
+				"nameList":placement["nameList"],
+				"variantList":placement["variantList"],
+				"jitterList":placement["jitterList"], "chunks":placement["chunks"]}
+
+	# generator placing the blocks of one chunk, yielding between blocks when
+	# placed one object at a time; new objects are tracked in self.chunkObjs
+	def placeChunk(self, context, job, chunk):
+		inds = chunk["blocks"]
+		if len(inds)==0: return
+		swap = job["object"]
+		swapGen = job["swapGen"]
+		swapProps = job["swapProps"]
+		locList = job["locList"][inds].tolist()
+		rotList = job["rotList"][inds].tolist()
+		jitterList = job["jitterList"][inds]
+		nameList = [job["nameList"][i] for i in inds.tolist()]
+		variantList = [job["variantList"][i] for i in inds.tolist()]
+		base = swapProps["object"]
+		grouped = swapProps["groupSwap"]
+		bpy.ops.object.select_all(action='DESELECT')
+
+		if self.use_dupliverts:
+			# all blocks become vertices of a few instancing carrier objects
+			start = self.stats.start()
+			carriers = self.placeDupliverts(context, swap, swapProps,
+					locList, rotList, nameList, jitterList)
+			self.chunkObjs += carriers
+			self.runcount += len(locList)
+			self.stats.stop("placement", start,
+					{"blocks":len(locList), "objects":len(carriers)})
+			return
+		elif self.meshswap_join and not grouped:
+			# build the joined mesh directly, no per-block objects; one mesh
+			# per level of detail variant
+			start = self.stats.start()
+			names = np.array(nameList)
+			for name in sorted(set(nameList)):
+				mask = names==name
+				objs = self.placeMerged(context, swap, name,
+						swapProps["lodObjects"].get(name, base),
+						[loc for loc, m in zip(locList, mask) if m],
+						[rot for rot, m in zip(rotList, mask) if m],
+						jitterList[mask])
+				for obj in objs:
+					if self.mergeAfter: obj["MCprep_merge"] = name
+				self.chunkObjs += objs
+			self.runcount += len(locList)
+			self.stats.stop("join", start, {"blocks":len(locList)})
+			return
+
+		for (loc,rot,jitter,randGroup,variant) in zip(locList,rotList,
+				jitterList.tolist(),nameList,variantList):
+			start = self.stats.start()
 			
-			### END CRITICAL SECTION
-				
-			if not grouped:
-				base.select = True
-				bpy.ops.object.delete() # the original copy used for duplication
+			### HIGH COMPUTATION/CRITICAL SECTION
+			#refresh the scene every once in awhile, if not already interactive
+			self.counterObject+=1
+			self.runcount +=1
+			if (self.counterObject > self.countMax) and not self.interactive:
+				self.counterObject = 0
+				#below technically a "hack", should use: bpy.data.scenes[0].update()
+				bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
+
+			if grouped:
+				# The built in method fails, bpy.ops.object.group_instance_add(...)
+				#UPDATE: I reported the bug, and they fixed it nearly instantly =D
+				# but it was recommended to do the below anyways.
+				obj = util.addGroupInstance(randGroup,loc)
+			else:
+				# copy of the preloaded object (or its level of detail
+				# variant), with its own mesh data as a duplicate would have
+				lodBase = swapProps["lodObjects"].get(randGroup, base)
+				obj = lodBase.copy()
+				obj.data = lodBase.data.copy()
+				if "MCprep_lodSource" in obj.data:
+					del obj.data["MCprep_lodSource"]
+				context.scene.objects.link(obj)
+				obj.location = mathutils.Vector(loc)
+			self.chunkObjs.append(obj)
+			if len(swapProps["lodNames"])>1:
+				# for switching the level of detail later, see MCPREP_meshswapLOD
+				obj["MCprep_lodBase"] = swapGen
+				obj["MCprep_lodName"] = variant
+
+			# do extra transformations now as necessary
+			obj.rotation_euler = baseRotation(swap)
+			obj.scale = swap.scale	
 			
-			#join meshes together
-			if not grouped and (len(dupedObj) >0) and self.meshswap_join:
-				#print(len(dupedObj))
-				# ERROR HERE if don't do the len(dupedObj) thing.
-				bpy.context.scene.objects.active = dupedObj[0]
-				for d in dupedObj:
-					d.select = True
+			#rotation/translation for walls
+			offset, rotation = meshswap_plan.rotationTransform(rot)
+			obj.location += mathutils.Vector(offset)
+			for i in range(3):
+				obj.rotation_euler[i] += rotation[i]
 				
-				bpy.ops.object.join()
-			
+			# extra variance to break up regularity, e.g. for tall grass
+			obj.location += mathutils.Vector(jitter)
 			bpy.ops.object.select_all(action='DESELECT')
-			swap.select = True
-			bpy.ops.object.delete()
-			
-			#Try to reselect everything that was selected previoulsy + new objects
-			for d in dupedObj:
-				try:
-					d.select = True # if this works, then..
-					selList.append(d)
-				except:
-					pass
+			self.stats.stop("placement", start, {"blocks":1, "objects":1})
+			yield
+		### END CRITICAL SECTION
+
+	# remove the preloaded objects used for duplication, once all are placed;
+	# groups are kept, as the placed instances use them
+	def removeAssets(self):
+		for obj in self.assets["objects"].values():
+			bpy.data.objects.remove(obj, do_unlink=True)
+		self.assets["objects"] = {}
+
+	# Join the chunks placed of each block type back into a single object, as
+	# if placed in one go: merged meshes per variant, and dupliverts carriers
+	# per variant and rotation, keeping the instance of the first carrier
+	def mergeChunks(self, context):
+		batches = {}
+		kept = []
+		for obj in self.placed:
+			if "MCprep_merge" in obj:
+				batches.setdefault(obj["MCprep_merge"], []).append(obj)
+				del obj["MCprep_merge"]
+			else:
+				kept.append(obj)
+		for key in sorted(batches):
+			objs = batches[key]
+			kept.append(objs[0])
+			if len(objs)==1: continue
+			for obj in objs[1:]:
+				for child in obj.children:
+					bpy.data.objects.remove(child, do_unlink=True)
 			bpy.ops.object.select_all(action='DESELECT')
-
-		# final reselection
-		for d in selList:
+			for obj in objs:
+				obj.select = True
+			context.scene.objects.active = objs[0]
+			bpy.ops.object.join()
+		self.placed = kept
+
+	# delete placed objects, including the instances parented to carriers
+	def removeObjects(self, objs):
+		for obj in objs:
+			if obj.name not in bpy.data.objects: continue
+			for child in obj.children:
+				bpy.data.objects.remove(child, do_unlink=True)
+			bpy.data.objects.remove(obj, do_unlink=True)
+
+	# report progress in the header and cursor while running interactively
+	def updateProgress(self, context):
+		if self.placeStart==None:
+			text = "Meshswap: planning {x} of {y} materials".format(
+				x=len(self.jobs), y=len(self.objList))
+			context.window_manager.progress_update(0)
+		else:
+			elapsed = max(time.time()-self.placeStart, 0.001)
+			rate = self.runcount/elapsed
+			remaining = self.blocksTotal-self.runcount
+			eta = remaining/rate if rate>0 else 0
+			text = "Meshswap: {x} of {y} blocks, {r} blocks/s, ETA {e}s "+\
+				"(Esc to cancel)"
+			text = text.format(x=self.runcount, y=self.blocksTotal,
+				r=int(rate), e=int(eta))
+			context.window_manager.progress_update(
+				100*self.runcount/max(self.blocksTotal,1))
+		self.area.header_text_set(text)
+
+	# save the timings log and report the slowest phases, if logging
+	def reportStats(self):
+		if not self.stats.enabled: return
+		path = bpy.path.abspath(self.stats_file) if self.stats_file!="" else \
+				os.path.join(bpy.app.tempdir, "meshswap_stats.json")
+		try:
+			self.stats.save(path)
+		except IOError as err:
+			self.report({'WARNING'}, "Could not save meshswap timings: "+str(err))
+			return
+		if conf.v:print("Meshswap timings saved: "+path)
+		self.report({'INFO'}, "Meshswap timings: {x}".format(
+				x=self.stats.summary()))
+
+	# clean up after all steps ran or on cancel, rolling back the objects of a
+	# partially placed chunk; finished chunks are kept
+	def finishSwap(self, context, cancelled=False):
+		if getattr(self, "_timer", None)!=None:
+			context.window_manager.event_timer_remove(self._timer)
+			context.window_manager.progress_end()
+			self.area.header_text_set()
+			self._timer = None
+
+		if cancelled:
+			self.steps.close() # stops any planning still running
+			self.runcount -= len(self.chunkObjs)
+			self.removeObjects(self.chunkObjs)
+			self.chunkObjs = []
+		start = self.stats.start()
+		self.removeAssets()
+
+		# cancelled before anything was placed, so undo what was loaded and
+		# leave the scene as it was
+		if cancelled and not self.changed:
+			for group in self.loadedGroups:
+				bpy.data.groups.remove(group, do_unlink=True)
+			self.stats.stop("cleanup", start)
+			self.reportStats()
+			self.report({'WARNING'}, "Meshswap cancelled, nothing swapped")
+			return {'CANCELLED'}
+		if not self.dry_run:
+			context.scene["MCprep_meshswap_chunks"] = self.chunkRecords
+
+		if self.dry_run:
+			self.stats.stop("cleanup", start)
+			self.reportStats()
+			self.report({'INFO'}, "Planned {x} blocks".format(x=self.blocksTotal))
+			return {'FINISHED'}
+
+		# remove the swapped and removable faces from the selected objects,
+		# once per mesh as selected objects may share one
+		removed = 0
+		meshes = {} # mesh name: objects using it, arrays of faces to remove
+		for obj in self.worldList:
+			objs, faces = meshes.setdefault(obj.data.name, ([], []))
+			objs.append(obj)
+			faces += self.removeFaces[obj.name]
+		for objs, faces in meshes.values():
+			if len(faces)==0: continue
+			faces = np.unique(np.concatenate(faces))
+			removeMeshFaces(objs, faces)
+			removed += len(faces)
+
+		if self.mergeAfter:
+			self.mergeChunks(context)
+
+		# final reselection, of everything previously selected + new objects
+		bpy.ops.object.select_all(action='DESELECT')
+		for d in self.selList+self.placed:
 			try:
 				d.select = True
 			except:
 				pass
-		
-		if runcount==0:
+		self.stats.stop("cleanup", start, {"faces":removed})
+		self.reportStats()
+
+		if cancelled:
+			# finished chunks are kept, so this is still an undoable change
+			self.report({'WARNING'}, "Meshswap cancelled after swapping {x} objects".format(
+				x=self.runcount))
+		elif self.runcount==0 and self.keptChunks>0:
+			self.report({'INFO'}, "Nothing changed, kept {x} previously swapped areas".format(
+				x=self.keptChunks))
+		elif self.runcount==0:
 			self.report({'ERROR'}, "Nothing swapped, likely no materials of selected objects match the meshswap file objects/groups")
-		elif runcount==1:
+		elif self.runcount==1:
 			self.report({'INFO'}, "Swapped 1 object")
+		elif self.keptChunks>0:
+			self.report({'INFO'}, "Swapped {x} objects, kept {y} unchanged areas".format(
+				x=self.runcount, y=self.keptChunks))
 		else:
-			self.report({'INFO'}, "Swapped {x} objects".format(x=runcount))
+			self.report({'INFO'}, "Swapped {x} objects".format(x=self.runcount))
 
 		return {'FINISHED'}
 
 
+class MCPREP_meshswapLOD(bpy.types.Operator):
+	"""Switch meshswapped blocks to the level of detail variant for their current distance from the active camera"""
+	bl_idname = "mcprep.meshswap_lod"
+	bl_label = "Update meshswap LOD"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	lod_distance = bpy.props.FloatProperty(
+		name="LOD distance",
+		default=32,
+		min=1,
+		description="Distance from the active camera after which each next "+\
+				"level of detail variant is used")
+
+	@classmethod
+	def poll(cls, context):
+		return context.scene.camera!=None
+
+	def execute(self, context):
+		# available variants by base name and level: groups follow the library
+		# naming, source meshes were tagged when imported by the meshswap (the
+		# per-block copies of them are not indexed)
+		groups = {}
+		for group in bpy.data.groups:
+			match = lodPattern.match(group.name)
+			if match:
+				groups.setdefault(match.group(1), {})[int(match.group(2))] = group
+		meshes = {}
+		for mesh in bpy.data.meshes:
+			if "MCprep_lodSource" in mesh:
+				meshes.setdefault(mesh["MCprep_lodBase"], {})[
+						mesh["MCprep_lodLevel"]] = mesh
+
+		objs = [obj for obj in context.selected_objects
+				if "MCprep_lodBase" in obj]
+		if len(objs)==0:
+			self.report({'ERROR'}, "No selected objects placed with meshswap level of detail")
+			return {'CANCELLED'}
+		camLoc = context.scene.camera.matrix_world.translation
+		levels = meshswap_plan.lodLevels(
+				[obj.matrix_world.translation for obj in objs],
+				camLoc, self.lod_distance, 2**16).tolist()
+
+		# only the instance references change, objects stay in place
+		changed = 0
+		for obj, level in zip(objs, levels):
+			base = obj["MCprep_lodBase"]
+			if obj.dupli_type == 'GROUP' and obj.dupli_group!=None:
+				variants = groups.get(base, {})
+				match = lodPattern.match(obj.dupli_group.name)
+				current = int(match.group(2)) if match else 0
+			elif obj.type == 'MESH':
+				variants = meshes.get(base, {})
+				current = obj.data.get("MCprep_lodLevel", 0)
+			else:
+				continue
+			# the highest available level not beyond the wanted one
+			wanted = max([lodLevel for lodLevel in variants if lodLevel<=level]+[0])
+			if wanted == current: continue
+			if obj.dupli_type == 'GROUP':
+				# level zero is the block's own group, e.g. a torch variant
+				new = variants.get(wanted) if wanted>0 else \
+						bpy.data.groups.get(obj["MCprep_lodName"])
+				if new==None: continue
+				obj.dupli_group = new
+			else:
+				new = variants.get(wanted)
+				if new==None: continue
+				old = obj.data
+				obj.data = new
+				# per-block copies aren't shared, so would be left orphaned
+				if old.users==0:
+					bpy.data.meshes.remove(old)
+			changed += 1
+
+		self.report({'INFO'}, "Changed level of detail of {x} objects".format(x=changed))
+		return {'FINISHED'}
+
 
 class fixMinewaysScale(bpy.types.Operator):
 	"""Quick upscaling of Mineways import by 10 for meshswapping"""
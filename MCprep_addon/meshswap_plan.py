@@ -0,0 +1,530 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2016 Patrick W. Crawford
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# ##### END MIT LICENSE BLOCK #####
+
+
+# Meshswap planning, working only on numpy arrays of face data so it can run
+# (and be profiled, cached or tested) outside of Blender. Nothing here may
+# import bpy; the meshswap operator reads the scene and places the plan.
+
+# library imports
+import os
+import itertools
+import json
+import time
+import zlib
+import numpy as np
+
+
+# -----------------------------------------------------------------------------
+# Block and chunk arrays
+# -----------------------------------------------------------------------------
+
+
+# check if faces are on the boundary between two blocks (local coordinates),
+# ie if any coordinate is a half integer, within tolerance for float error;
+# faces just inside a block (e.g. ladders at 1/16th in) are not on the edge.
+# Takes a single location or an Nx3 array
+def onEdge(faceLoc, tolerance=1e-3):
+	loc = np.asarray(faceLoc, dtype=np.float64)
+	return np.any(np.abs(loc - np.floor(loc) - 0.5) < tolerance, axis=-1)
+
+
+# level of detail for each point by distance from the camera, going up one
+# level every lod_distance up to the last available level
+def lodLevels(points, camLoc, distance, maxLevel):
+	points = np.asarray(points, dtype=np.float64).reshape(-1,3)
+	dist = np.sqrt(((points - np.asarray(camLoc, dtype=np.float64))**2).sum(axis=1))
+	return np.minimum((dist/distance).astype(int), maxLevel)
+
+
+# pack Nx3 integer block coordinates into one int64 key per block, so sets of
+# blocks can be sorted, grouped and searched as plain numpy arrays
+def packKeys(blocks):
+	blocks = np.asarray(blocks, dtype=np.int64).reshape(-1,3) + 2**20
+	return (blocks[:,0]<<42) | (blocks[:,1]<<21) | blocks[:,2]
+
+
+# inverse of packKeys, back to Nx3 integer blocks
+def unpackKeys(keys):
+	keys = np.asarray(keys, dtype=np.int64).reshape(-1)
+	mask = 2**21-1
+	return np.stack([(keys>>42)&mask, (keys>>21)&mask, keys&mask], axis=1) - 2**20
+
+
+# chunk cells of size newSize overlapping the chunk cell of a given size
+def overlappingCells(cell, size, newSize):
+	cell = np.asarray(cell, dtype=np.int64)
+	lower = np.floor_divide(cell*size, newSize).tolist()
+	upper = np.floor_divide((cell+1)*size-1, newSize).tolist()
+	return list(itertools.product(*[range(low, up+1)
+			for low, up in zip(lower, upper)]))
+
+
+# mask of which keys are present in a sorted array of keys
+def inSorted(keys, sortedKeys):
+	if len(sortedKeys)==0:
+		return np.zeros(len(keys), dtype=bool)
+	ind = np.minimum(np.searchsorted(sortedKeys, keys), len(sortedKeys)-1)
+	return sortedKeys[ind] == keys
+
+
+# mask of Nx3 integer blocks whose six neighbours are all in the sorted
+# array of occupied packed keys, ie blocks which can't be seen
+def enclosedMask(blocks, occupied):
+	blocks = np.asarray(blocks, dtype=np.int64).reshape(-1,3)
+	mask = np.ones(len(blocks), dtype=bool)
+	for offset in [(1,0,0),(-1,0,0),(0,1,0),(0,-1,0),(0,0,1),(0,0,-1)]:
+		mask &= inSorted(packKeys(blocks+offset), occupied)
+	return mask
+
+
+# group block and face positions into chunks of size blocks wide, returning
+# (block indices, face indices, packed chunk coords) per chunk; positions are
+# Nx3 block coords
+def splitChunks(blocks, faceBlocks, size):
+	keys = packKeys(np.floor_divide(
+			np.concatenate([blocks, faceBlocks]).astype(np.int64), size))
+	unique, inverse = np.unique(keys, return_inverse=True)
+	order = np.argsort(inverse, kind='mergesort')
+	groups = np.split(order, np.cumsum(np.bincount(inverse,
+			minlength=len(unique)))[:-1])
+	count = len(blocks)
+	return [(g[g<count], g[g>=count]-count, key)
+			for g, key in zip(groups, unique.tolist())]
+
+
+# mask of Nx3 points within the box between two corners, grown by a margin
+def boxMask(points, corner1, corner2, margin=0):
+	lower = np.minimum(corner1, corner2) - margin
+	upper = np.maximum(corner1, corner2) + margin
+	return np.all((points >= lower) & (points <= upper), axis=1)
+
+
+# mask of Nx3 world points in a camera's view, grown by a margin; camInverse
+# is the inverted camera matrix_world, frame its four view_frame corners in
+# camera space (the camera looks down -z)
+def frustumMask(points, camInverse, frame, ortho, clipStart, clipEnd, margin=0):
+	local = matrixApply(camInverse, points)
+	depth = -local[:,2]
+	mask = (depth > clipStart-margin) & (depth < clipEnd+margin)
+	frame = np.array(frame, dtype=np.float64)
+	if ortho:
+		lower = frame[:,:2].min(axis=0) - margin
+		upper = frame[:,:2].max(axis=0) + margin
+		return mask & np.all((local[:,:2] > lower) & (local[:,:2] < upper), axis=1)
+
+	# four side planes through the camera origin, normals facing inwards
+	center = frame.mean(axis=0)
+	for i in range(4):
+		normal = np.cross(frame[i], frame[(i+1)%4])
+		if normal.dot(center) < 0:
+			normal = -normal
+		normal /= np.linalg.norm(normal)
+		mask &= local.dot(normal) > -margin
+	return mask
+
+
+# apply a 4x4 matrix (e.g. matrix_world) to a list or Nx3 array of points
+def matrixApply(matrix, points):
+	mat = np.array(matrix, dtype=np.float64)
+	points = np.asarray(points, dtype=np.float64).reshape(-1,3)
+	return points.dot(mat[:3,:3].T) + mat[:3,3]
+
+
+# Local offset moving an object's points by half a block along every global
+# axis, from its 4x4 (or 3x3) matrix; Mineways exports blocks on the corners
+# rather than centered. None if the matrix has zero scale
+def halfBlockOffset(matrix):
+	mat = np.array(matrix, dtype=np.float64)[:3,:3]
+	try:
+		return np.linalg.solve(mat, [0.5, 0.5, 0.5])
+	except np.linalg.LinAlgError:
+		return None
+
+
+# rotation rules per exporter, loaded from meshswap_rotations.json
+rotationRules = None
+
+
+# Load the rotation rules and per-code transforms from meshswap_rotations.json,
+# once per session. Rules are compiled to (code, [(axis, lower, upper)]) lists
+# per exporter and block category, transforms to arrays indexed by code
+def getRotationRules():
+	global rotationRules
+	if rotationRules!=None:
+		return rotationRules
+
+	path = os.path.join(os.path.dirname(__file__),"meshswap_rotations.json")
+	with open(path) as data_file:
+		data = json.load(data_file)
+
+	codes = [int(code) for code in data["transforms"]]
+	offsets = np.zeros((max(codes)+1,3))
+	rotations = np.zeros((max(codes)+1,3))
+	for code in codes:
+		offsets[code] = data["transforms"][str(code)]["offset"]
+		rotations[code] = data["transforms"][str(code)]["rotation"]
+
+	exporters = {}
+	for exporter in data["exporters"]:
+		exporters[exporter] = {}
+		for category, rules in data["exporters"][exporter].items():
+			compiled = []
+			for rule in rules:
+				bounds = []
+				for axis, diff in enumerate(["x_diff","y_diff","z_diff"]):
+					if diff in rule:
+						bounds.append((axis, rule[diff][0], rule[diff][1]))
+				compiled.append((rule["rotation"], bounds))
+			exporters[exporter][category] = compiled
+
+	rotationRules = {"priority":data["priority"], "offsets":offsets,
+			"rotations":rotations, "exporters":exporters}
+	return rotationRules
+
+
+# location offset and euler rotation added to a placed block per rotation code;
+# 1-4 are torches against walls, 5-8 edge blocks e.g. ladders, vines, doors
+def rotationTransform(rot):
+	rules = getRotationRules()
+	return rules["offsets"][rot], rules["rotations"][rot]
+
+
+# Rotation code per face from its Nx3 rounding differences (x_diff, y_diff,
+# z_diff), using the exporter's rules for the block's category; each rule is
+# an exclusive range per diff, the first rule matching a face wins, and faces
+# matching no rule get code 0
+def classifyRotations(exporter, swapProps, diffs):
+	rules = getRotationRules()
+	rots = np.zeros(len(diffs), dtype=int)
+	table = rules["exporters"].get(exporter, {})
+	category = None
+	for cat in rules["priority"]:
+		if swapProps.get(cat)==True:
+			category = cat
+			break
+	if category not in table:
+		return rots
+
+	unset = np.ones(len(diffs), dtype=bool)
+	for rot, bounds in table[category]:
+		mask = unset.copy()
+		for axis, lower, upper in bounds:
+			if lower!=None:
+				mask &= diffs[:,axis] > lower
+			if upper!=None:
+				mask &= diffs[:,axis] < upper
+		rots[mask] = rot
+		unset &= np.logical_not(mask)
+	return rots
+
+
+# random number generator for one block type's variance and variants, seeded
+# from the user seed and the block name so results don't depend on the order
+# objects are swapped in
+def swapRandom(seed, name):
+	return np.random.RandomState(
+		(seed + zlib.crc32(name.encode('utf-8'))) % 2**32)
+
+
+# fingerprint of the planned placement of a chunk, to tell if it changed since
+# a previous meshswap; a hex string, as ID properties only hold 32 bit ints
+def chunkFingerprint(settings, locList, rotList, nameList, jitterList):
+	crc = zlib.crc32(settings.encode('utf-8'))
+	crc = zlib.crc32(np.round(np.asarray(locList, dtype=np.float64)*1000)
+			.astype(np.int64).tobytes(), crc)
+	crc = zlib.crc32(np.asarray(rotList, dtype=np.int64).tobytes(), crc)
+	crc = zlib.crc32(np.round(np.asarray(jitterList, dtype=np.float64)*1000)
+			.astype(np.int64).tobytes(), crc)
+	crc = zlib.crc32("/".join(nameList).encode('utf-8'), crc)
+	return "{:08x}".format(crc & 0xffffffff)
+
+
+# extra random location variance per block as an Nx3 array, to break up
+# regularity e.g. for tall grass; variance 1 is xyz, 0 is xy only so the base
+# stays the same
+def varianceOffsets(variance, count, rng):
+	offsets = np.zeros((count,3))
+	if [True,1] == variance:
+		offsets[:,:2] = (rng.random_sample((count,2))-0.5)*0.5
+		offsets[:,2] = (rng.random_sample(count)/2-0.5)*0.6
+	elif [True,0] == variance:
+		# values LOWER than *1.0 make it less variable
+		offsets[:,:2] = (rng.random_sample((count,2))-0.5)*0.5
+	return offsets
+
+
+# rotation matrix (3x3) of an XYZ euler rotation, as mathutils.Euler would give
+def eulerMatrix(rotation):
+	cx, cy, cz = np.cos(rotation)
+	sx, sy, sz = np.sin(rotation)
+	rotX = np.array([[1,0,0], [0,cx,-sx], [0,sx,cx]])
+	rotY = np.array([[cy,0,sy], [0,1,0], [-sy,0,cy]])
+	rotZ = np.array([[cz,-sz,0], [sz,cz,0], [0,0,1]])
+	return rotZ.dot(rotY).dot(rotX)
+
+
+# Tile a base mesh once per block, equivalent to duplicating the base per block
+# and joining: verts are the base's Vx3 (scaled) vertex coordinates, loopVerts
+# and loopStart its loop vertex indices and polygon loop starts. Blocks are
+# placed at their locations plus rotation code offset and jitter, rotated by
+# rotBase plus the code's rotation. Returns the flat vertex coordinates, loop
+# vertex indices and polygon loop starts of the tiled mesh
+def tileMesh(verts, loopVerts, loopStart, locList, rotList, jitter, rotBase):
+	verts = np.asarray(verts, dtype=np.float64).reshape(-1,3)
+	rots = np.array(rotList, dtype=int)
+	locs = np.array(locList, dtype=np.float64).reshape(-1,3)
+	locs += getRotationRules()["offsets"][rots]
+	locs += jitter
+	count = len(locs)
+
+	# per block translation, then one rotated copy of the base per code
+	coords = np.empty((count,len(verts),3), dtype=np.float32)
+	for rot in np.unique(rots).tolist():
+		rotation = rotationTransform(rot)[1]
+		mat = eulerMatrix([rotBase[i]+rotation[i] for i in range(3)])
+		mask = rots==rot
+		coords[mask] = locs[mask][:,None,:] + verts.dot(mat.T)[None,:,:]
+
+	blockIds = np.arange(count, dtype=np.int32)
+	loopVerts = np.tile(loopVerts, count) + \
+			np.repeat(blockIds*len(verts), len(loopVerts))
+	loopStart = np.tile(loopStart, count) + \
+			np.repeat(blockIds*len(loopVerts), len(loopStart))
+	return coords.ravel(), loopVerts, loopStart
+
+
+# -----------------------------------------------------------------------------
+# Planning
+# -----------------------------------------------------------------------------
+
+
+# Plan the blocks of one block type from its faces (local coordinates, Nx3
+# centers and normals, N areas), the exporter and the swap properties. Returns
+# the integer block positions (Mx3) and rotation codes to place, and the block
+# each face belongs to (Nx3), for chunking and removing the faces afterwards.
+# If a timings dict is given, seconds spent per step are added to it
+def planBlocks(centers, normals, areas, exporter, swapProps, doubleTall=False,
+		timings=None):
+	centers = np.asarray(centers, dtype=np.float64).reshape(-1,3)
+	normals = np.asarray(normals, dtype=np.float64).reshape(-1,3)
+	areas = np.asarray(areas)
+	# hack for not having too many torches show up, both jmc2obj and Mineways
+	keep = np.logical_not((areas < 0.016) & (areas > 0.015))
+	faceBlocks = np.round(centers)
+	centers = centers[keep]
+	normals = normals[keep]
+
+	# faces on a unit block boundary (local coord!) are pushed into
+	# their block along the normal, inwards unless floating off an edge
+	outsideBool = -1
+	if swapProps.get('edgeFloat')==True: outsideBool = 1
+	edge = onEdge(centers)
+	blocks = np.round(centers + normals*(0.4*outsideBool)*edge[:,None])
+	faceBlocks[keep] = blocks
+	# differences from rounding, this gets us the rotation!
+	if timings!=None: start = time.time()
+	rotAll = classifyRotations(exporter, swapProps, blocks - centers)
+	if timings!=None:
+		timings["rotation"] = timings.get("rotation",0) + time.time()-start
+		start = time.time()
+
+	# removing duplicates and checking orientation
+	dupList = []	#where actual blocks are to be added
+	rotList = []	#rotation of blocks
+	dupIndex = {}	#(x,y,z) integer key -> index in dupList, for O(1) lookups
+	for (x,y,z),rot in zip(blocks.astype(int).tolist(), rotAll.tolist()):
+		key = (x,y,z)
+
+		### START HACK PATCH, FOR MINEWAYS double-tall adding
+		# prevent double high grass... which mineways names sunflowers.
+		# keep only the lower block, moving an upper one already added down
+		if doubleTall:
+			if (x,y-1,z) in dupIndex:
+				continue
+			above = (x,y+1,z)
+			if above in dupIndex:
+				ind = dupIndex.pop(above)
+				dupList[ind] = [x,y,z]
+				dupIndex[key] = ind
+				continue
+		### END HACK PATCH
+
+		# rotation value (second append value: 0 means nothing, rest 1-4.
+		if (key not in dupIndex) or swapProps.get('edgeFloat')==True:
+			# append location
+			if key not in dupIndex:
+				dupIndex[key] = len(dupList)
+			dupList.append([x,y,z])
+			rotList.append(rot)
+
+	if timings!=None:
+		timings["dedup"] = timings.get("dedup",0) + time.time()-start
+	return (np.array(dupList, dtype=np.int64).reshape(-1,3),
+			np.array(rotList, dtype=int), faceBlocks)
+
+
+# planBlocks returning its timings too, for running in worker processes
+def planBlocksTimed(*args):
+	timings = {}
+	return planBlocks(*args, timings=timings), timings
+
+
+# Turn the planned blocks of one block type into what gets placed, split up
+# into spatial chunks by global block position so a chunk is the same for a
+# re-imported world. worldMatrix is the swapped object's matrix_world and
+# blockShift the global shift from whole block coordinates to placement
+# positions; occupied, if given, is a sorted array of packed solid blocks to
+# skip enclosed blocks with, and camera the location to pick level of detail
+# names by. Unless chunked, all blocks are returned as a single chunk without
+# a key. Timings of the occlusion, chunks and transform phases are added to
+# the timings dict, if given
+def placementPlan(blocks, rotations, faceBlocks, worldMatrix, blockShift,
+		name, variance, variants, seed, chunkSize, settings="", occupied=None,
+		lodNames=None, camera=None, lodDistance=1, chunked=True, timings=None):
+	blocks = np.asarray(blocks, dtype=np.int64).reshape(-1,3)
+	rotations = np.asarray(rotations, dtype=int)
+	worldMatrix = np.array(worldMatrix, dtype=np.float64)
+	# global block coordinates, the same for any object the world is in
+	start = time.time()
+	worldBlocks = np.round(matrixApply(worldMatrix, blocks))
+	worldFaces = np.round(matrixApply(worldMatrix, faceBlocks))
+
+	# skip blocks hidden on all six sides by solid blocks
+	hidden = np.zeros(len(blocks), dtype=bool)
+	if occupied is not None and len(blocks)>0:
+		hidden = enclosedMask(worldBlocks, occupied)
+		blocks = blocks[np.logical_not(hidden)]
+		rotations = rotations[np.logical_not(hidden)]
+		worldBlocks = worldBlocks[np.logical_not(hidden)]
+	if timings!=None:
+		timings["occlusion"] = timings.get("occlusion",0) + time.time()-start
+
+	# chunks by global block position; faces go with the block they rounded to
+	start = time.time()
+	chunks = []
+	for blockInds, faceInds, coord in splitChunks(worldBlocks, worldFaces,
+			chunkSize):
+		chunks.append({"blocks":blockInds, "faces":faceInds,
+				"cell":tuple(unpackKeys(coord)[0].tolist()),
+				"key":"{x}/{y}/{z:x}".format(x=name, y=chunkSize, z=coord),
+				"seed":"{x}/{y:x}".format(x=name, y=coord)})
+	if timings!=None:
+		timings["chunks"] = timings.get("chunks",0) + time.time()-start
+
+	# local block coordinates to placement, shifted back by half a block
+	start = time.time()
+	matrix = worldMatrix.copy()
+	matrix[:3,3] -= blockShift
+	locList = matrixApply(matrix, blocks)
+	# roll variance and variants per chunk, so a chunk is placed the same
+	# regardless of edits elsewhere
+	jitterList = np.zeros((len(locList),3))
+	variantList = [name]*len(locList)
+	for chunk in chunks:
+		inds = chunk["blocks"]
+		rng = swapRandom(seed, chunk["seed"])
+		jitterList[inds] = varianceOffsets(variance, len(inds), rng)
+		if len(variants)>1:
+			for ind, pick in zip(inds.tolist(),
+					rng.randint(0, len(variants), size=len(inds)).tolist()):
+				variantList[ind] = variants[pick]
+	# farther blocks use the level of detail names, if any; the level zero
+	# variant (e.g. a torch variant) is kept for switching back later
+	nameList = variantList
+	if lodNames!=None and len(lodNames)>1 and camera!=None and len(locList)>0:
+		levels = lodLevels(locList, camera, lodDistance, len(lodNames)-1)
+		nameList = [lodNames[level] if level>0 else variant
+				for variant, level in zip(variantList, levels.tolist())]
+	for chunk in chunks:
+		inds = chunk["blocks"]
+		chunk["fingerprint"] = chunkFingerprint(settings, locList[inds],
+				rotations[inds], [nameList[i] for i in inds.tolist()],
+				jitterList[inds])
+	if not chunked and len(chunks)>1:
+		chunks = [{"blocks":np.arange(len(locList)), "key":None,
+				"faces":np.concatenate([chunk["faces"] for chunk in chunks]),
+				"cell":None, "seed":None, "fingerprint":None}]
+	if timings!=None:
+		timings["transform"] = timings.get("transform",0) + time.time()-start
+	return {"blocks":blocks, "rotList":rotations, "matrix":matrix,
+			"locList":locList, "nameList":nameList, "variantList":variantList,
+			"jitterList":jitterList, "chunks":chunks, "hidden":int(hidden.sum())}
+
+
+# Combine the planned blocks of several block types into one compact placement
+# plan. Entries are dicts of the swapped object's name and 4x4 matrix from its
+# local block coordinates to placement positions, the block name and its
+# planned positions and rotations; the plan holds per block a block type id
+# and object id (indexing names and objects), the integer position in local
+# block coordinates of that object and the rotation code
+def makePlan(entries):
+	names = []
+	objects = []
+	matrices = []
+	types = [np.zeros(0, dtype=np.int32)]
+	objectIds = [np.zeros(0, dtype=np.int32)]
+	positions = [np.zeros((0,3), dtype=np.int32)]
+	rotations = [np.zeros(0, dtype=np.int8)]
+	for entry in entries:
+		if entry["name"] not in names:
+			names.append(entry["name"])
+		if entry["object"] not in objects:
+			objects.append(entry["object"])
+			matrices.append(np.array(entry["matrix"], dtype=np.float64))
+		count = len(entry["rotations"])
+		types.append(np.full(count, names.index(entry["name"]), dtype=np.int32))
+		objectIds.append(np.full(count, objects.index(entry["object"]),
+				dtype=np.int32))
+		positions.append(np.asarray(entry["blocks"], dtype=np.int32).reshape(-1,3))
+		rotations.append(np.asarray(entry["rotations"], dtype=np.int8))
+	return {"names":names, "objects":objects,
+			"matrices":np.array(matrices, dtype=np.float64).reshape(-1,4,4),
+			"types":np.concatenate(types), "objectIds":np.concatenate(objectIds),
+			"positions":np.concatenate(positions),
+			"rotations":np.concatenate(rotations)}
+
+
+# Write a placement plan to a compressed numpy .npz file, for placing later
+# with meshswap's place from plan option or for use in other tools
+def savePlan(path, plan):
+	with open(path, 'wb') as plan_file:
+		np.savez_compressed(plan_file,
+			names=np.array(plan["names"], dtype=np.str_).reshape(-1),
+			objects=np.array(plan["objects"], dtype=np.str_).reshape(-1),
+			matrices=plan["matrices"], types=plan["types"],
+			objectIds=plan["objectIds"], positions=plan["positions"],
+			rotations=plan["rotations"])
+
+
+# read a placement plan written by savePlan
+def loadPlan(path):
+	data = np.load(path)
+	try:
+		return {"names":data["names"].tolist(), "objects":data["objects"].tolist(),
+				"matrices":data["matrices"], "types":data["types"],
+				"objectIds":data["objectIds"], "positions":data["positions"],
+				"rotations":data["rotations"]}
+	finally:
+		data.close()
@@ -24,6 +24,7 @@
 
 import bpy
 import random
+import collections
 import os
 
 from subprocess import Popen, PIPE
@@ -77,19 +78,28 @@ def nameGeneralize(name):
 
 
 # ---------
-# gets all materials on input list of objects
+# gets all materials on input list of objects, including the objects of
+# instanced (and nested) groups. Each object and group is visited once, and
+# materials are returned without repetition in order of first use
 def materialsFromObj(objList): # old name: getObjectMaterials
 	matList = []
-	#loop over every object, adding each material if not already added
-	for obj in objList:
-		if obj.dupli_group:
-			for a in obj.dupli_group.objects:
-				objList.append(a)
+	seenMats = set()
+	seenObjs = set()
+	seenGroups = set()
+	queue = collections.deque(objList)
+	while queue:
+		obj = queue.popleft()
+		if obj in seenObjs: continue
+		seenObjs.add(obj)
+		if obj.dupli_group and obj.dupli_group not in seenGroups:
+			seenGroups.add(obj.dupli_group)
+			queue.extend(obj.dupli_group.objects)
 		if obj.type != 'MESH': continue
-		objectsMaterials = obj.material_slots
-		for materialID in objectsMaterials:
-			if materialID.material not in matList:
-				matList.append(materialID.material)
+		for materialID in obj.material_slots:
+			mat = materialID.material
+			if mat == None or mat in seenMats: continue
+			seenMats.add(mat)
+			matList.append(mat)
 	return matList
 
 
@@ -150,15 +160,11 @@ def bAppendLink(directory,name, toLink, active_layer=True):
 
 
 # ---------
-# check if a face is on the boundary between two blocks (local coordinates)
-def onEdge(faceLoc):
-	strLoc = [ str(faceLoc[0]).split('.')[1][0],
-				str(faceLoc[1]).split('.')[1][0],
-				str(faceLoc[2]).split('.')[1][0] ]
-	if (strLoc[0] == '5' or strLoc[1] == '5' or strLoc[2] == '5'):
-		return True
-	else:
-		return False
+# names of the variants randomizeMeshSawp picks from, for picking in batches
+def meshSwapVariants(swap,variations):
+	if swap not in ['torch','Torch']:
+		return [swap]
+	return [swap]+[swap+".{x}".format(x=i) for i in range(1,variations)]
 
 
 # ---------
@@ -220,6 +226,30 @@ def remap_users(old, new):
 		return "not available prior to blender 2.78"
 
 
+# ---------
+# Remap many materials at once, from a dict of old to new material, in one
+# pass over the material slots of objects and object data. Users left after,
+# such as from drivers, are remapped one at a time with remap_users
+def remapMaterials(mapping):
+	if len(mapping)==0: return 0
+	for coll in [bpy.data.meshes, bpy.data.curves, bpy.data.metaballs]:
+		for data in coll:
+			if data.library != None: continue
+			for index, mat in enumerate(data.materials):
+				if mat in mapping:
+					data.materials[index] = mapping[mat]
+	for ob in bpy.data.objects:
+		if ob.library != None: continue
+		for sl in ob.material_slots:
+			if sl.link == 'OBJECT' and sl.material in mapping:
+				sl.material = mapping[sl.material]
+	for old, new in mapping.items():
+		if old.users - int(old.use_fake_user) > 0:
+			res = remap_users(old, new)
+			if res != 0: return res
+	return 0
+
+
 # ---------
 # quick script for linking all objects back into a scene
 """
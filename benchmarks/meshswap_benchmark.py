@@ -0,0 +1,257 @@
+###
+# DO NOT DISTRIBUTE WITH ADDON
+# Benchmark of the meshswap planning and placement stages on synthetic worlds
+#
+# Runs without Blender: synthetic jmc2obj (block centered) or Mineways (block
+# corner aligned) style face arrays stand in for the imported world mesh, and
+# the array-only stages of meshswap are run from MCprep_addon/meshswap_plan.py,
+# the same functions the meshswap operator calls. Results are printed or
+# written as JSON:
+#
+#   python meshswap_benchmark.py --sizes 32 64 128 --output bench.json
+#
+###
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+
+addon_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+		"..", "MCprep_addon")
+
+# swap properties per block type, as found in the meshswap blend file
+swap_props = {
+	"tall_grass": {"variance": 1},
+	"torch": {"torchlike": True},
+	"vines": {"edgeFloat": True},
+	"Wooden_Door": {"doorlike": True},
+	}
+
+scenes = ["grass", "torches", "vines", "doors"]
+exporters = ["jmc2obj", "Mineways"]
+
+
+# ---------
+# load the planner module on its own, as the addon package imports bpy
+def loadPlanner():
+	spec = importlib.util.spec_from_file_location("meshswap_plan",
+			os.path.join(addon_dir, "meshswap_plan.py"))
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+
+# ---------
+# faces of a thin box around a center, as centers, normals and areas arrays
+def boxFaces(center, size):
+	center = np.asarray(center, dtype=np.float64)
+	size = np.asarray(size, dtype=np.float64)
+	centers = []
+	normals = []
+	areas = []
+	for axis in range(3):
+		for sign in [-1, 1]:
+			normal = np.zeros(3)
+			normal[axis] = sign
+			centers.append(center + normal*size/2)
+			normals.append(normal)
+			others = [size[i] for i in range(3) if i!=axis]
+			areas.append(others[0]*others[1])
+	return centers, normals, areas
+
+
+# ---------
+# Synthetic world faces of one block type, in local block coordinates with y
+# up (as the swapped object's mesh data). Returns the block name, Nx3 centers
+# and normals, N areas and the solid blocks around, for occlusion
+def makeWorld(scene, size, rng):
+	centers = []
+	normals = []
+	areas = []
+	solid = []
+	if scene == "grass":
+		# flat field, crossed planes of tall grass over a layer of dirt
+		name = "tall_grass"
+		diag = np.sqrt(0.5)
+		for x in range(size):
+			for z in range(size):
+				solid.append([x,0,z])
+				for normal in [[diag,0,diag], [-diag,0,-diag],
+						[diag,0,-diag], [-diag,0,diag]]:
+					centers.append([x,1,z])
+					normals.append(normal)
+					areas.append(1.4)
+	elif scene == "torches":
+		# corridors along x, a torch on alternating walls every other block
+		name = "torch"
+		for z in range(0, size, 4):
+			for x in range(0, size, 2):
+				solid += [[x,1,z-1], [x,1,z+1]]
+				side = 1 if (x//2)%2 else -1
+				box = boxFaces([x, 1.1, z-0.3*side], [0.12, 0.6, 0.12])
+				centers += box[0]
+				normals += box[1]
+				areas += box[2]
+				# small flame face, dropped by the torch area filter
+				centers.append([x, 1.45, z-0.3*side])
+				normals.append([0,1,0])
+				areas.append(0.0155)
+	elif scene == "vines":
+		# forest of trunks with vines hanging on the sides of the trunks
+		name = "vines"
+		trees = rng.randint(0, size, size=(size*size//16, 2))
+		for x, z in trees.tolist():
+			for y in range(1, 6):
+				solid.append([x,y,z])
+				for normal in [[1,0,0], [-1,0,0], [0,0,1], [0,0,-1]]:
+					if rng.random_sample() < 0.5: continue
+					normal = np.array(normal, dtype=np.float64)
+					centers.append(np.array([x,y,z]) + normal*0.55)
+					normals.append(normal)
+					areas.append(1.0)
+	elif scene == "doors":
+		# village houses, each with a two block tall door in one wall
+		name = "Wooden_Door"
+		for x in range(0, size, 6):
+			for z in range(0, size, 6):
+				for y in [1, 2]:
+					solid += [[x-1,y,z], [x+1,y,z]]
+					box = boxFaces([x, y, z+0.4], [1.0, 1.0, 0.18])
+					centers += box[0]
+					normals += box[1]
+					areas += box[2]
+	else:
+		raise ValueError("Unknown scene: "+scene)
+	return (name, np.array(centers, dtype=np.float64).reshape(-1,3),
+			np.array(normals, dtype=np.float64).reshape(-1,3),
+			np.array(areas, dtype=np.float64), np.array(solid).reshape(-1,3))
+
+
+# ---------
+# cube base mesh to place per block: vertices, loop vertex indices and starts
+def cubeMesh():
+	verts = np.array([[x,y,z] for x in [-.5,.5] for y in [-.5,.5]
+			for z in [-.5,.5]], dtype=np.float64)
+	loops = np.array([0,1,3,2, 4,6,7,5, 0,4,5,1, 2,3,7,6, 0,2,6,4, 1,5,7,3],
+			dtype=np.int32)
+	return verts, loops, np.arange(0, 24, 4, dtype=np.int32)
+
+
+# ---------
+# Run the meshswap stages on one synthetic world, returning counts, per phase
+# timings in seconds, rates and the peak traced memory in bytes
+def runWorld(planner, scene, exporter, size, seed, chunkSize):
+	rng = np.random.RandomState(seed)
+	name, centers, normals, areas, solid = makeWorld(scene, size, rng)
+	# world object matrix, and the global shift from whole block coordinates
+	# to placement positions
+	worldMatrix = np.eye(4)
+	blockShift = 0
+	if exporter == "Mineways":
+		# Mineways exports blocks on the corners rather than centered
+		centers -= 0.5
+		blockShift = 0.5
+	props = swap_props[name]
+	phases = {}
+
+	tracemalloc.start()
+	start = time.perf_counter()
+	if exporter == "Mineways":
+		# as the meshswap operator does, plan from face centers shifted by
+		# half a block and place shifted back
+		centers = centers + planner.halfBlockOffset(worldMatrix)
+	phases["offset"] = time.perf_counter()-start
+
+	start = time.perf_counter()
+	planSteps = {}
+	blocks, rots, faceBlocks = planner.planBlocks(centers, normals, areas,
+			exporter, props, doubleTall=name in ["Wooden_Door"],
+			timings=planSteps)
+	phases["plan"] = time.perf_counter()-start
+
+	# occlusion, chunks and transform (jitter, variants, fingerprints) phases,
+	# as the meshswap operator places a planned material
+	occupied = np.unique(planner.packKeys(solid))
+	variance = [True, props["variance"]] if "variance" in props else [False,0]
+	placement = planner.placementPlan(blocks, rots, faceBlocks, worldMatrix,
+			blockShift, name, variance, [name], seed, chunkSize,
+			occupied=occupied, timings=phases)
+	locList = placement["locList"]
+	rots = placement["rotList"]
+	jitterList = placement["jitterList"]
+	chunks = placement["chunks"]
+
+	start = time.perf_counter()
+	verts, loops, loopStart = cubeMesh()
+	coords, loopVerts, loopStarts = planner.tileMesh(verts, loops, loopStart,
+			locList, rots, jitterList, [0,0,0])
+	phases["tile"] = time.perf_counter()-start
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	placing = phases["chunks"]+phases["transform"]+phases["tile"]
+	return {"scene":scene, "exporter":exporter, "size":size,
+			"faces":len(centers), "blocks":len(blocks),
+			"hidden":placement["hidden"], "chunks":len(chunks),
+			"vertices":len(coords)//3, "phases":phases, "plan_steps":planSteps,
+			"faces_per_s":len(centers)/max(phases["plan"], 1e-9),
+			"blocks_per_s":len(blocks)/max(placing, 1e-9),
+			"peak_memory":peak}
+
+
+# ---------
+# keep the fastest of repeated runs of the same world
+def bestOf(results):
+	best = min(results, key=lambda res: sum(res["phases"].values()))
+	best["repeats"] = len(results)
+	return best
+
+
+def main(args=None):
+	parser = argparse.ArgumentParser(
+			description="Benchmark meshswap planning on synthetic worlds")
+	parser.add_argument("--sizes", type=int, nargs="+", default=[32, 64, 128],
+			help="world widths in blocks")
+	parser.add_argument("--scenes", nargs="+", default=scenes, choices=scenes)
+	parser.add_argument("--exporters", nargs="+", default=exporters,
+			choices=exporters)
+	parser.add_argument("--repeat", type=int, default=3,
+			help="runs per world, the fastest is kept")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--chunk-size", type=int, default=16)
+	parser.add_argument("--output", default=None,
+			help="JSON file to write, otherwise printed")
+	args = parser.parse_args(args)
+
+	planner = loadPlanner()
+	results = []
+	for exporter in args.exporters:
+		for scene in args.scenes:
+			for size in args.sizes:
+				runs = [runWorld(planner, scene, exporter, size, args.seed,
+						args.chunk_size) for i in range(args.repeat)]
+				results.append(bestOf(runs))
+				print("{e} {s} {n}: {f} faces, {b} blocks, {r:.0f} faces/s".format(
+					e=exporter, s=scene, n=size, f=results[-1]["faces"],
+					b=results[-1]["blocks"], r=results[-1]["faces_per_s"]),
+					file=sys.stderr)
+
+	report = {"numpy":np.__version__, "python":sys.version.split()[0],
+			"results":results}
+	if args.output:
+		with open(args.output, 'w') as out_file:
+			json.dump(report, out_file, indent=1)
+	else:
+		print(json.dumps(report, indent=1))
+	return report
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,171 @@
+###
+# DO NOT DISTRIBUTE WITH ADDON
+# Tests of the array-only meshswap planning in MCprep_addon/meshswap_plan.py,
+# which run without Blender:
+#
+#   python -m unittest discover tests
+#
+###
+
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+
+addon_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+		"..", "MCprep_addon")
+
+
+# load the planner module directly, as the addon package imports bpy
+def loadPlanner():
+	spec = importlib.util.spec_from_file_location("meshswap_plan",
+			os.path.join(addon_dir, "meshswap_plan.py"))
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+planner = loadPlanner()
+
+
+# the six faces of a jmc2obj (block centered) cube at a block position
+def cubeFaces(block):
+	normals = np.array([[0,1,0],[0,-1,0],[1,0,0],[-1,0,0],[0,0,1],[0,0,-1]],
+			dtype=np.float64)
+	centers = np.asarray(block, dtype=np.float64) + normals*0.5
+	return centers, normals, np.ones(len(normals))
+
+
+class PlanBlocksTest(unittest.TestCase):
+
+	def test_cube_faces_plan_one_block(self):
+		centers, normals, areas = cubeFaces([2,0,3])
+		dupList, rotList, faceBlocks = planner.planBlocks(centers, normals,
+				areas, "jmc2obj", {})
+		self.assertEqual(dupList.tolist(), [[2,0,3]])
+		self.assertEqual(rotList.tolist(), [0])
+		self.assertEqual(len(faceBlocks), len(centers))
+
+	def test_blocks_are_deduplicated(self):
+		faces = [cubeFaces(block) for block in [[0,0,0],[1,0,0],[0,0,0]]]
+		centers, normals, areas = [np.concatenate(arrays) for arrays in zip(*faces)]
+		dupList, rotList, faceBlocks = planner.planBlocks(centers, normals,
+				areas, "jmc2obj", {})
+		self.assertEqual(sorted(dupList.tolist()), [[0,0,0],[1,0,0]])
+		self.assertEqual(len(rotList), 2)
+
+	def test_double_tall_keeps_lower_block(self):
+		centers = np.array([[2,1,3],[2,0,3]], dtype=np.float64)
+		normals = np.array([[1,0,0],[1,0,0]], dtype=np.float64)
+		dupList, rotList, faceBlocks = planner.planBlocks(centers, normals,
+				np.ones(2), "Mineways", {}, doubleTall=True)
+		self.assertEqual(dupList.tolist(), [[2,0,3]])
+
+	def test_timings(self):
+		centers, normals, areas = cubeFaces([0,0,0])
+		planned, timings = planner.planBlocksTimed(centers, normals, areas,
+				"jmc2obj", {})
+		self.assertEqual(planned[0].tolist(), [[0,0,0]])
+		self.assertIn("rotation", timings)
+		self.assertIn("dedup", timings)
+
+
+class PlacementPlanTest(unittest.TestCase):
+
+	def place(self, blocks, **kwargs):
+		blocks = np.array(blocks)
+		args = {"worldMatrix":np.identity(4), "blockShift":0, "name":"torch",
+				"variance":[False,0], "variants":["torch","torch.1","torch.2"],
+				"seed":0, "chunkSize":4}
+		args.update(kwargs)
+		return planner.placementPlan(blocks, np.zeros(len(blocks)),
+				blocks.astype(np.float64), **args)
+
+	def test_chunks_by_global_position(self):
+		placement = self.place([[0,0,0],[1,0,0],[5,0,0]])
+		self.assertEqual(sorted([chunk["cell"] for chunk in placement["chunks"]]),
+				[(0,0,0),(1,0,0)])
+		# an object moved by whole chunks keeps its blocks' global chunks
+		matrix = np.identity(4)
+		matrix[:3,3] = [-4,0,0]
+		moved = self.place([[4,0,0],[5,0,0],[9,0,0]], worldMatrix=matrix)
+		self.assertEqual(sorted([chunk["key"] for chunk in moved["chunks"]]),
+				sorted([chunk["key"] for chunk in placement["chunks"]]))
+		self.assertEqual(sorted([chunk["fingerprint"] for chunk in moved["chunks"]]),
+				sorted([chunk["fingerprint"] for chunk in placement["chunks"]]))
+
+	def test_occluded_blocks_skipped(self):
+		solid = [[1,0,0],[-1,0,0],[0,1,0],[0,-1,0],[0,0,1],[0,0,-1]]
+		occupied = np.unique(planner.packKeys(solid))
+		placement = self.place([[0,0,0],[3,0,0]], occupied=occupied)
+		self.assertEqual(placement["hidden"], 1)
+		self.assertEqual(placement["blocks"].tolist(), [[3,0,0]])
+
+	def test_unchunked(self):
+		placement = self.place([[0,0,0],[9,9,9]], chunked=False)
+		self.assertEqual(len(placement["chunks"]), 1)
+		self.assertIsNone(placement["chunks"][0]["key"])
+		self.assertEqual(sorted(placement["chunks"][0]["blocks"].tolist()), [0,1])
+
+	def test_level_of_detail_keeps_variants(self):
+		blocks = [[x,0,0] for x in range(40)]
+		placement = self.place(blocks, lodNames=["torch","torch_lod1"],
+				camera=[0,0,0], lodDistance=10)
+		self.assertEqual(placement["nameList"][:10], placement["variantList"][:10])
+		self.assertEqual(set(placement["nameList"][10:]), {"torch_lod1"})
+		self.assertTrue(set(placement["variantList"]) <=
+				{"torch","torch.1","torch.2"})
+
+
+class PlanFileTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_round_trip(self):
+		matrix = np.identity(4)
+		matrix[:3,3] = [-0.5, -0.5, -0.5]
+		entries = [
+			{"object":"world", "matrix":matrix.tolist(), "name":"torch",
+				"blocks":np.array([[1,2,3],[-4,5,-6]]),
+				"rotations":np.array([0,3])},
+			{"object":"world.001", "matrix":np.identity(4).tolist(),
+				"name":"tall_grass", "blocks":np.array([[7,8,9]]),
+				"rotations":np.array([0])},
+			{"object":"world", "matrix":matrix.tolist(), "name":"tall_grass",
+				"blocks":np.zeros((0,3)), "rotations":np.zeros(0)}]
+		plan = planner.makePlan(entries)
+		path = os.path.join(self.directory, "plan.npz")
+		planner.savePlan(path, plan)
+		loaded = planner.loadPlan(path)
+
+		self.assertEqual(loaded["names"], ["torch", "tall_grass"])
+		self.assertEqual(loaded["objects"], ["world", "world.001"])
+		np.testing.assert_array_equal(loaded["matrices"],
+				[matrix, np.identity(4)])
+		self.assertEqual(loaded["types"].tolist(), [0,0,1])
+		self.assertEqual(loaded["objectIds"].tolist(), [0,0,1])
+		self.assertEqual(loaded["positions"].tolist(),
+				[[1,2,3],[-4,5,-6],[7,8,9]])
+		self.assertEqual(loaded["rotations"].tolist(), [0,3,0])
+		for key in plan:
+			if isinstance(plan[key], np.ndarray):
+				self.assertEqual(loaded[key].dtype, plan[key].dtype, key)
+
+	def test_empty_plan(self):
+		path = os.path.join(self.directory, "plan.npz")
+		planner.savePlan(path, planner.makePlan([]))
+		loaded = planner.loadPlan(path)
+		self.assertEqual(loaded["names"], [])
+		self.assertEqual(loaded["positions"].shape, (0,3))
+		self.assertEqual(loaded["matrices"].shape, (0,4,4))
+
+
+if __name__ == '__main__':
+	unittest.main()